@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# Throughput benchmark for rendering individual card PNGs with `cardimage`.
+#
+# Renders the same synthetic cards with one worker process and with a pool of workers,
+# and reports cards/sec for each.
+#
+# Usage (from the project root):
+#   python3 benchmarks/card_images.py --cards 200
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pyqrcode
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from qrocodile import cardimage  # noqa: E402
+
+
+# Write a synthetic artwork and QR code for each card, and return the render jobs
+def make_jobs(workdir, count):
+    art_file = os.path.join(workdir, 'art.jpg')
+    Image.effect_mandelbrot((1200, 1200), (-2, -1.5, 1, 1.5), 100).convert('RGB').save(art_file)
+    jobs = []
+    for i in range(count):
+        qr_file = os.path.join(workdir, '{0}qr.png'.format(i))
+        pyqrcode.create('ID:BENCH{0:03d}'.format(i), error='Q').png(qr_file, scale=6)
+        jobs.append((os.path.join(workdir, '{0}card.png'.format(i)), art_file, qr_file,
+                     'Track {0} with a fairly long title'.format(i), 'Artist {0}'.format(i), 'Album {0}'.format(i)))
+    return jobs
+
+
+def bench(name, jobs, workers):
+    start = time.perf_counter()
+    cardimage.render_cards(jobs, workers=workers)
+    elapsed = time.perf_counter() - start
+    print('{0:<16} {1:>8.1f} cards/sec'.format(name, len(jobs) / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark card PNG rendering.')
+    parser.add_argument('--cards', type=int, default=100, help='number of cards to render')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='size of the worker pool')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        jobs = make_jobs(workdir, args.cards)
+        bench('1 worker', jobs, 1)
+        bench('{0} workers'.format(args.workers), jobs, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# Microbenchmark for reading card metadata out of library browse results.
+#
+# Compares items/sec of:
+#   roundtrip - SoCo objects re-serialized with `to_didl_string` and re-parsed (the old approach)
+#   objects   - fields read directly from the SoCo objects
+#   raw       - fields read from the raw DIDL-Lite browse result in one pass
+#
+# Usage (from the project root):
+#   python3 benchmarks/didl_extraction.py --items 5000
+import argparse
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from soco.data_structures import to_didl_string
+from soco.data_structures_entry import from_didl_string
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from qrocodile.library import object_fields, parse_didl_result  # noqa: E402
+
+DIDL_HEADER = ('<DIDL-Lite xmlns:dc="http://purl.org/dc/elements/1.1/" '
+               'xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" '
+               'xmlns:r="urn:schemas-rinconnetworks-com:metadata-1-0/" '
+               'xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/">')
+
+TRACK_TEMPLATE = (
+    '<item id="S://computer/music/iTunes/Music/Artist%20{0}/Album%20{0}/{0:02d}%20Track.mp3" '
+    'parentID="A:TRACKS" restricted="true">'
+    '<res protocolInfo="x-file-cifs:*:audio/mpeg:*" duration="0:03:00">'
+    'x-file-cifs://computer/music/iTunes/Music/Artist%20{0}/Album%20{0}/{0:02d}%20Track.mp3</res>'
+    '<upnp:albumArtURI>/getaa?u=x-file-cifs%3a%2f%2fcomputer%2fmusic%2fiTunes%2fMusic%2fArtist%2520{0}'
+    '%2fAlbum%2520{0}%2f{0:02d}%2520Track.mp3&amp;v=158</upnp:albumArtURI>'
+    '<dc:title>Track {0}</dc:title><upnp:class>object.item.audioItem.musicTrack</upnp:class>'
+    '<dc:creator>Artist {0}</dc:creator><upnp:album>Album {0}</upnp:album>'
+    '<upnp:originalTrackNumber>1</upnp:originalTrackNumber></item>')
+
+
+def build_result(count):
+    return DIDL_HEADER + ''.join(TRACK_TEMPLATE.format(i) for i in range(count)) + '</DIDL-Lite>'
+
+
+def extract_roundtrip(result):
+    rows = []
+    for track in from_didl_string(result):
+        didl = to_didl_string(track)
+        xmltree = ET.ElementTree(ET.fromstring(didl)).getroot()
+        rows.append((xmltree[0][1].text, xmltree[0][2].text, xmltree[0][0].text, xmltree[0][4].text,
+                     xmltree[0][3].text))
+    return rows
+
+
+def extract_objects(result):
+    return [object_fields(track) for track in from_didl_string(result)]
+
+
+def extract_raw(result):
+    return parse_didl_result(result)
+
+
+def bench(name, func, result, count, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(result)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('{0:<10} {1:>12,.0f} items/sec'.format(name, count / best))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DIDL-Lite metadata extraction.')
+    parser.add_argument('--items', type=int, default=2000, help='number of synthetic tracks')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs (best is reported)')
+    args = parser.parse_args()
+
+    result = build_result(args.items)
+    bench('roundtrip', extract_roundtrip, result, args.items, args.repeat)
+    bench('objects', extract_objects, result, args.items, args.repeat)
+    bench('raw', extract_raw, result, args.items, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
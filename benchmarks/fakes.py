@@ -0,0 +1,244 @@
+# Local stand-ins for the services qrgen talks to, used by the benchmarks.
+#
+# `FakeSonos` is an HTTP server answering ContentDirectory SOAP requests (Browse and
+# GetSystemUpdateID) for a synthetic music library, and serving album art from `/getaa`
+# and Spotify-style artwork URLs. SoCo always talks to port 1400, so the server has to
+# listen there (on 127.0.0.1 by default); point qrgen at it with `--speaker-ip 127.0.0.1`.
+#
+# `FakeSpotify` stands in for a `spotipy.Spotify` client, returning synthetic metadata
+# whose artwork is served by `FakeSonos`.
+import io
+import re
+import threading
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+from xml.sax.saxutils import escape
+
+from PIL import Image
+
+SONOS_PORT = 1400
+
+# Side of the synthetic artwork, in pixels (large enough to make artwork normalization work)
+ART_SIZE = 1000
+
+ZONE_UUID = 'RINCON_000E58FAKE0001400'
+
+DIDL_HEADER = ('<DIDL-Lite xmlns:dc="http://purl.org/dc/elements/1.1/" '
+               'xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" '
+               'xmlns:r="urn:schemas-rinconnetworks-com:metadata-1-0/" '
+               'xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/">')
+DIDL_FOOTER = '</DIDL-Lite>'
+
+SOAP_RESPONSE = ('<?xml version="1.0"?>'
+                 '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+                 's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>'
+                 '<u:{0}Response xmlns:u="urn:schemas-upnp-org:service:ContentDirectory:1">{1}'
+                 '</u:{0}Response></s:Body></s:Envelope>')
+SOAP_ERROR = ('<?xml version="1.0"?>'
+              '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+              's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body><s:Fault>'
+              '<faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring><detail>'
+              '<UPnPError xmlns="urn:schemas-upnp-org:control-1-0"><errorCode>{0}</errorCode></UPnPError>'
+              '</detail></s:Fault></s:Body></s:Envelope>')
+
+
+def make_art(size=ART_SIZE):
+    image = Image.effect_mandelbrot((size, size), (-2, -1.5, 1, 1.5), 64).convert('RGB')
+    data = io.BytesIO()
+    image.save(data, 'JPEG', quality=95)
+    return data.getvalue()
+
+
+# A synthetic music library of `size` albums with ten tracks each, plus a few playlists
+class FakeLibrary:
+    def __init__(self, size):
+        self.albums = []
+        self.tracks = []
+        for a in range(size):
+            artist = 'Artist {0}'.format(a % max(1, size // 4))
+            title = 'Album {0}'.format(a)
+            path = 'computer/music/iTunes/Music/{0}/{1}'.format(quote(artist), quote(title))
+            art = '/getaa?u=' + quote('x-file-cifs://{0}/01 Track.mp3'.format(path), safe='') + '&v=1'
+            self.albums.append({'id': 'A:ALBUM/' + quote(title), 'title': title, 'creator': artist,
+                                'uri': 'x-rincon-playlist:{0}#A:ALBUM/{1}'.format(ZONE_UUID, quote(title)),
+                                'art': art})
+            for t in range(1, 11):
+                uri = 'x-file-cifs://{0}/{1:02d}%20Track%20{2}.mp3'.format(path, t, t)
+                self.tracks.append({'id': 'S://' + uri[len('x-file-cifs://'):], 'title': 'Track {0}'.format(t),
+                                    'creator': artist, 'album': title, 'uri': uri, 'art': art})
+        self.sonos_playlists = [{'id': 'SQ:{0}'.format(p), 'title': 'Playlist {0}'.format(p),
+                                 'uri': 'file:///jffs/settings/savedqueues.rsq#{0}'.format(p)} for p in range(10)]
+        self.playlists = [{'id': 'S://computer/music/iTunes/iTunes%20Music%20Library.xml#{0:016X}'.format(p),
+                           'title': 'Imported {0}'.format(p),
+                           'uri': 'x-file-cifs://computer/music/iTunes/iTunes%20Music%20Library.xml#{0:016X}'
+                                  .format(p)} for p in range(10)]
+        self.system_update_id = 1
+
+    # Return the list of items (and their DIDL-Lite element kind and class) for an object id
+    def container(self, object_id):
+        if object_id == 'A:ALBUM':
+            return self.albums, 'container', 'object.container.album.musicAlbum'
+        if object_id == 'A:TRACKS':
+            return self.tracks, 'item', 'object.item.audioItem.musicTrack'
+        if object_id.startswith('A:TRACKS:'):
+            term = unquote(object_id[len('A:TRACKS:'):]).lower()
+            tracks = [t for t in self.tracks if term in (t['title'] + ' ' + t['creator'] + ' ' + t['album']).lower()]
+            return tracks, 'item', 'object.item.audioItem.musicTrack'
+        if object_id == 'SQ:':
+            return self.sonos_playlists, 'container', 'object.container.playlistContainer'
+        if object_id == 'A:PLAYLISTS':
+            return self.playlists, 'container', 'object.container.playlistContainer'
+        return None
+
+    # Return the card input lines of all albums and tracks, as `--list-library-*` would write them
+    def album_lines(self):
+        return ['alb:{0}${1}${2}${3}'.format(a['id'], a['creator'], a['title'], a['art']) for a in self.albums]
+
+    def track_lines(self):
+        return ['trk:{0}${1}${2}${3}${4}'.format(t['uri'], t['creator'], t['title'], t['album'], t['art'])
+                for t in self.tracks]
+
+    def playlist_lines(self):
+        return ['pl:{0}${1}'.format(p['uri'], p['title']) for p in self.sonos_playlists]
+
+
+def didl_element(item, kind, upnp_class, parent_id):
+    xml = '<{0} id="{1}" parentID="{2}" restricted="true">'.format(kind, escape(item['id'], {'"': '&quot;'}),
+                                                                   parent_id)
+    xml += '<dc:title>{0}</dc:title>'.format(escape(item['title']))
+    xml += '<upnp:class>{0}</upnp:class>'.format(upnp_class)
+    xml += '<res protocolInfo="x-file-cifs:*:audio/mpeg:*">{0}</res>'.format(escape(item['uri']))
+    if 'creator' in item:
+        xml += '<dc:creator>{0}</dc:creator>'.format(escape(item['creator']))
+    if 'art' in item:
+        xml += '<upnp:albumArtURI>{0}</upnp:albumArtURI>'.format(escape(item['art']))
+    if 'album' in item:
+        xml += '<upnp:album>{0}</upnp:album>'.format(escape(item['album']))
+    xml += '</{0}>'.format(kind)
+    return xml
+
+
+class FakeSonosHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith('/getaa') or self.path.startswith('/art/'):
+            self.send(200, 'image/jpeg', self.server.art)
+        else:
+            self.send(404, 'text/plain', b'not found')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        action = re.search(r'#(\w+)"?$', self.headers.get('SOAPACTION', '')).group(1)
+        request = ET.fromstring(body).find('{http://schemas.xmlsoap.org/soap/envelope/}Body')[0]
+        args = dict((child.tag, child.text or '') for child in request)
+        library = self.server.library
+
+        if action == 'GetSystemUpdateID':
+            self.soap(action, '<Id>{0}</Id>'.format(library.system_update_id))
+        elif action == 'Browse':
+            found = library.container(args['ObjectID'])
+            if found is None:
+                self.send(500, 'text/xml', SOAP_ERROR.format(701).encode('utf-8'))
+                return
+            items, kind, upnp_class = found
+            start = int(args['StartingIndex'])
+            count = int(args['RequestedCount']) or len(items)
+            page = items[start:start + count]
+            didl = DIDL_HEADER + ''.join(didl_element(item, kind, upnp_class, args['ObjectID'])
+                                         for item in page) + DIDL_FOOTER
+            self.soap(action, '<Result>{0}</Result><NumberReturned>{1}</NumberReturned>'
+                              '<TotalMatches>{2}</TotalMatches><UpdateID>{3}</UpdateID>'
+                      .format(escape(didl), len(page), len(items), library.system_update_id))
+        else:
+            self.send(500, 'text/xml', SOAP_ERROR.format(401).encode('utf-8'))
+
+    def soap(self, action, content):
+        self.send(200, 'text/xml; charset="utf-8"', SOAP_RESPONSE.format(action, content).encode('utf-8'))
+
+
+# The fake speaker, serving in a background thread until `stop()` is called
+class FakeSonos:
+    def __init__(self, library, host='127.0.0.1', port=SONOS_PORT):
+        self.server = ThreadingHTTPServer((host, port), FakeSonosHandler)
+        self.server.daemon_threads = True
+        self.server.library = library
+        self.server.art = make_art()
+        self.host = host
+        self.port = port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def art_url(self, name):
+        return 'http://{0}:{1}/art/{2}.jpg'.format(self.host, self.port, name)
+
+
+# Stand-in for `spotipy.Spotify`, covering the calls made by qrgen
+class FakeSpotify:
+    def __init__(self, art_url):
+        self.art_url = art_url
+        self.requests = 0
+
+    def _track(self, uri):
+        track_id = uri.split(':')[-1]
+        return {'uri': uri, 'name': 'Spotify Track ' + track_id, 'artists': [{'name': 'Spotify Artist'}],
+                'album': {'name': 'Spotify Album', 'images': [{'url': self.art_url('t' + track_id)}]}}
+
+    def _album(self, uri):
+        album_id = uri.split(':')[-1]
+        return {'uri': uri, 'name': 'Spotify Album ' + album_id, 'artists': [{'name': 'Spotify Artist'}],
+                'images': [{'url': self.art_url('a' + album_id)}]}
+
+    def _artist(self, uri):
+        artist_id = uri.split(':')[-1]
+        return {'uri': uri, 'name': 'Spotify Artist ' + artist_id, 'images': [{'url': self.art_url('r' + artist_id)}]}
+
+    def track(self, uri):
+        self.requests += 1
+        return self._track(uri)
+
+    def tracks(self, uris, market=None):
+        self.requests += 1
+        return {'tracks': [self._track(uri) for uri in uris]}
+
+    def album(self, uri):
+        self.requests += 1
+        return self._album(uri)
+
+    def albums(self, uris):
+        self.requests += 1
+        return {'albums': [self._album(uri) for uri in uris]}
+
+    def artist(self, uri):
+        self.requests += 1
+        return self._artist(uri)
+
+    def artists(self, uris):
+        self.requests += 1
+        return {'artists': [self._artist(uri) for uri in uris]}
+
+    def artist_top_tracks(self, uri, country='US'):
+        self.requests += 1
+        artist_id = uri.split(':')[-1]
+        return {'tracks': [self._track('spotify:track:{0}{1}'.format(artist_id[:-2], n)) for n in range(10, 20)]}
+
+    def user_playlist(self, user, uri):
+        self.requests += 1
+        return {'name': 'Spotify Playlist', 'owner': {'id': user},
+                'images': [{'url': self.art_url('p' + uri.split(':')[-1])}]}
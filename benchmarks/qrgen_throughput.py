@@ -0,0 +1,233 @@
+#!/usr/bin/python
+# Throughput benchmark for qrgen, run entirely against local stand-ins (see `fakes.py`):
+# no Sonos speaker, Spotify account, or internet access is needed.
+#
+# For each input size, `generate_cards` is run on a synthetic input file mixing library
+# albums, tracks and playlists, Spotify tracks, albums and artists, and commands. The
+# `list_library_*` functions are run against a synthetic library. Each scenario runs in its
+# own process, and reports items/sec, peak RSS, and the time spent in each stage. The artwork,
+# card images and QR code checks run on worker processes, so the peak RSS of the largest of
+# those is reported separately (they run side by side, so together they can use several times
+# that).
+#
+# Usage (from the project root; the fake speaker listens on 127.0.0.1:1400):
+#   python3 benchmarks/qrgen_throughput.py --sizes 100 1000 10000
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+import fakes  # noqa: E402
+from qrocodile import artwork, cardimage, qrgen  # noqa: E402
+from qrocodile import library as sonos_library  # noqa: E402
+
+# Static files qrgen expects in its working directory
+PROJECT_FILES = ['cards.css', 'sonos_360.png', 'ic_album_black_48dp.png', 'ic_playlist_play_black_48dp.png']
+
+# Share of each kind of card in the synthetic input files
+INPUT_MIX = [('album', 40), ('track', 25), ('playlist', 10), ('spotify_track', 10), ('spotify_album', 5),
+             ('spotify_artist', 5), ('command', 5)]
+
+STAGES = ['metadata', 'qr', 'artwork', 'html', 'images']
+
+
+# Accumulates the wall-clock time spent in each stage. qrgen finishes batches of cards
+# (artwork, images) on a separate thread while it generates the next batch, so stages can
+# overlap, and their times can add up to more than the total.
+class StageTimer:
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.lock = threading.Lock()
+        # stages of the wrapped calls in progress, per thread
+        self.local = threading.local()
+
+    # Replace `owner.name` with a wrapper that adds the time spent in it to `stage`. Time
+    # spent in nested wrapped calls (on the same thread) is counted in their own stage, and
+    # taken out of the caller's.
+    def wrap(self, owner, name, stage):
+        func = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            stack = self.local.__dict__.setdefault('stack', [])
+            stack.append(stage)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                with self.lock:
+                    self.times[stage] += elapsed
+                    if stack:
+                        self.times[stack[-1]] -= elapsed
+
+        setattr(owner, name, timed)
+
+
+def make_workdir(speaker):
+    workdir = tempfile.mkdtemp(prefix='qrgen-bench-')
+    for name in PROJECT_FILES:
+        shutil.copyfile(os.path.join(PROJECT_DIR, name), os.path.join(workdir, name))
+    os.mkdir(os.path.join(workdir, 'out'))
+    defaults = {'default_spotify_user': '', 'default_room': 'Bench', 'speaker_ip': speaker.host,
+                'SPOTIPY_CLIENT_ID': '', 'SPOTIPY_CLIENT_SECRET': '', 'SPOTIPY_REDIRECT_URI': '',
+                'album_uuid_prefix': 'x-rincon-playlist:' + fakes.ZONE_UUID}
+    with open(os.path.join(workdir, 'my_defaults.txt'), 'w') as f:
+        json.dump(defaults, f)
+    commands = {}
+    for action in ['play', 'pause', 'next', 'prev', 'stop']:
+        commands['cmd:' + action] = {'command': 'cmd:' + action, 'label': action.title(),
+                                     'image': speaker.art_url('cmd-' + action)}
+    with open(os.path.join(workdir, 'command_cards.txt'), 'w') as f:
+        json.dump(commands, f)
+    return workdir
+
+
+# Write a synthetic qrgen input file of `count` lines
+def make_input(path, count, library):
+    sources = {
+        'album': library.album_lines(),
+        'track': library.track_lines(),
+        'playlist': library.playlist_lines(),
+        'spotify_track': ['spotify:track:{0:022d}'.format(i) for i in range(count)],
+        'spotify_album': ['spotify:album:{0:022d}'.format(i) for i in range(count)],
+        'spotify_artist': ['spotify:artist:{0:022d}'.format(i) for i in range(count)],
+        'command': ['cmd:play', 'cmd:pause', 'cmd:next', 'cmd:prev', 'cmd:stop'],
+    }
+    pattern = [kind for kind, share in INPUT_MIX for _ in range(share)]
+    used = defaultdict(int)
+    with open(path, 'w') as f:
+        for i in range(count):
+            kind = pattern[i % len(pattern)]
+            lines = sources[kind]
+            f.write(lines[used[kind] % len(lines)] + '\n')
+            used[kind] += 1
+
+
+# Give qrgen the command line `argv` (and the defaults in the working directory)
+def load_qrgen(argv):
+    qrgen.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    return qrgen
+
+
+# Run one scenario in this process and return its measurements
+def run_scenario(scenario, size, library_albums, generate_images):
+    library = fakes.FakeLibrary(library_albums)
+    speaker = fakes.FakeSonos(library).start()
+    workdir = make_workdir(speaker)
+    os.chdir(workdir)
+    try:
+        timer = StageTimer()
+        if scenario == 'generate':
+            make_input('input.txt', size, library)
+            argv = ['--input', 'input.txt']
+            if generate_images:
+                argv.append('--generate-images')
+            qrgen = load_qrgen(argv)
+            qrgen.sp = fakes.FakeSpotify(speaker.art_url)
+            timer.wrap(qrgen, 'prefetch_spotify', 'metadata')
+            # (the QR codes and artwork of each card are timed in their own stages)
+            timer.wrap(qrgen, 'process_line', 'metadata')
+            timer.wrap(qrgen, 'write_qr', 'qr')
+            timer.wrap(qrgen, 'fetch_artwork', 'artwork')
+            timer.wrap(artwork, 'normalize_all', 'artwork')
+            timer.wrap(qrgen.CardSheet, 'add_card', 'html')
+            timer.wrap(qrgen.CardSheet, 'close', 'html')
+            timer.wrap(cardimage, 'render_cards', 'images')
+            run = qrgen.generate_cards
+            items = size
+        else:
+            qrgen = load_qrgen(['--list-library-tracks'] if scenario == 'list-tracks' else [])
+            # (`browse_library` is a generator, so the pages it requests and parses are timed)
+            timer.wrap(sonos_library, 'browse_page', 'metadata')
+            timer.wrap(sonos_library, 'parse_didl_result', 'metadata')
+            run = {'list-albums': qrgen.list_library_albums, 'list-tracks': qrgen.list_library_tracks,
+                   'list-playlists': qrgen.list_library_playlists}[scenario]
+            items = {'list-albums': len(library.albums), 'list-tracks': len(library.tracks),
+                     'list-playlists': len(library.sonos_playlists) + len(library.playlists)}[scenario]
+
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+
+        stages = dict(timer.times)
+        return {
+            'scenario': scenario,
+            'items': items,
+            'seconds': elapsed,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            # (`generate_cards` shuts its worker pool down, so the workers have been waited for)
+            'peak_worker_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            'stages': stages,
+        }
+    finally:
+        speaker.stop()
+        os.chdir(PROJECT_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_results(results):
+    header = '{0:<16} {1:>7} {2:>9} {3:>10} {4:>9} {5:>9}'.format('scenario', 'items', 'seconds', 'items/sec',
+                                                                   'peak MB', 'worker MB')
+    header += ''.join(' {0:>9}'.format(stage) for stage in STAGES)
+    print(header)
+    for r in results:
+        row = '{0:<16} {1:>7} {2:>9.2f} {3:>10.1f} {4:>9.1f} {5:>9.1f}'.format(
+            r['scenario'], r['items'], r['seconds'], r['items'] / r['seconds'], r['peak_rss_kb'] / 1024,
+            r['peak_worker_rss_kb'] / 1024)
+        row += ''.join(' {0:>9.2f}'.format(r['stages'].get(stage, 0.0)) for stage in STAGES)
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark qrgen against local stand-ins.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='numbers of input lines for the card generation runs')
+    parser.add_argument('--library-albums', type=int, default=500,
+                        help='number of albums in the synthetic library (ten tracks each)')
+    parser.add_argument('--generate-images', action='store_true', help='also render individual card PNGs')
+    parser.add_argument('--skip-listing', action='store_true', help='skip the library listing scenarios')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--run-scenario', nargs=2, metavar=('SCENARIO', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        scenario, size = args.run_scenario
+        result = run_scenario(scenario, int(size), args.library_albums, args.generate_images)
+        print(json.dumps(result))
+        return
+
+    scenarios = [('generate', size) for size in args.sizes]
+    if not args.skip_listing:
+        scenarios += [('list-albums', 0), ('list-tracks', 0), ('list-playlists', 0)]
+
+    results = []
+    for scenario, size in scenarios:
+        command = [sys.executable, os.path.abspath(__file__), '--run-scenario', scenario, str(size),
+                   '--library-albums', str(args.library_albums)]
+        if args.generate_images:
+            command.append('--generate-images')
+        output = subprocess.check_output(command, cwd=PROJECT_DIR)
+        results.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
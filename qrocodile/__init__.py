@@ -0,0 +1,5 @@
+# qrocodile: a kid-friendly system for controlling Sonos with QR codes.
+#
+# `qrgen` generates the cards and `qrplay` plays them; run either with
+# `python3 qrgen.py` / `python3 qrplay.py` from the project directory, or as
+# `python3 -m qrocodile.qrgen` / `python3 -m qrocodile.qrplay`.
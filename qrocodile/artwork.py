@@ -0,0 +1,96 @@
+# Fetching and normalizing card artwork.
+#
+# Sonos `/getaa` and Spotify return full-size covers, often several megabytes. Artwork is
+# downloaded with a size cap (a source that is cut off, either by the cap or by the
+# server, is decoded as far as it goes), then downscaled and recompressed to the size the
+# card layout needs.
+import http.client
+import io
+import logging
+import os
+import urllib.request
+
+from PIL import Image, ImageFile
+
+from . import cardimage, parallel
+
+# Decode whatever part of a cut-off image was received, instead of failing
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+# Largest artwork download, in bytes
+MAX_ARTWORK_BYTES = 8 * 1024 * 1024
+
+# Side of the square box artwork is scaled to fit, in pixels (the card art box at print scale)
+ARTWORK_SIZE = cardimage.px(cardimage.ART_SIZE)
+
+# Quality of the recompressed artwork
+ARTWORK_QUALITY = 85
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 30
+
+
+# Download artwork from `url` to `artout`, reading at most `max_bytes`. If the transfer
+# fails partway, whatever was received is kept. Returns False if nothing was received.
+def fetch_artwork(url, artout, max_bytes=MAX_ARTWORK_BYTES):
+    received = 0
+    with open(artout, 'wb') as f:
+        try:
+            with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+                while received < max_bytes:
+                    chunk = response.read(min(DOWNLOAD_CHUNK_SIZE, max_bytes - received))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    received += len(chunk)
+                else:
+                    logging.info('Artwork %s is larger than %d bytes, using the first part only' % (url, max_bytes))
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            # (URLError and timeouts are OSErrors; a cut-off chunked transfer raises
+            # IncompleteRead, an HTTPException)
+            logging.info('Error fetching artwork %s after %d bytes: %s' % (url, received, e))
+    return received > 0
+
+
+# Downscale and recompress an artwork file in place, so it fits in the card art box.
+# Only the scale needed is decoded (for JPEGs), and cut-off files are decoded as far as
+# they go. Returns False if the file can't be decoded at all.
+def normalize_artwork(artfile, size=ARTWORK_SIZE):
+    try:
+        with open(artfile, 'rb') as f:
+            data = f.read()
+        image = Image.open(io.BytesIO(data))
+        (width, height) = image.size
+        image_format = image.format
+        image.draft('RGB', (size, size))
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logging.info('Could not decode artwork %s: %s' % (artfile, e))
+        return False
+
+    if width <= size and height <= size and image_format == 'JPEG':
+        # already small enough
+        return True
+
+    image.thumbnail((size, size), Image.LANCZOS)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # flatten transparent images (e.g. the generic icons) onto a white background
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, (0, 0), image)
+        image = background
+    image.convert('RGB').save(artfile, 'JPEG', quality=ARTWORK_QUALITY, optimize=True, progressive=True)
+    return True
+
+
+# Normalize artwork files on a pool of worker processes (`pool`, or one process per core by
+# default). Files that can't be decoded are removed, and returned so that their cards can use
+# a generic image instead.
+def normalize_all(artfiles, workers=None, pool=None):
+    artfiles = list(artfiles)
+    results = parallel.map_jobs(normalize_artwork, artfiles, workers, pool)
+    failed = [artfile for artfile, ok in zip(artfiles, results) if not ok]
+    for artfile in failed:
+        logging.info('Could not use art %s, removing it.' % (artfile))
+        os.remove(artfile)
+    return failed
@@ -0,0 +1,147 @@
+# Renders individual card PNGs (artwork, QR code, and labels) without a browser.
+#
+# The layout follows the `.singlecard` rules in `cards.css`: a 360x320 card with the
+# artwork and the QR code side by side in 180x180 boxes, and the labels centered in a
+# 160px column under the artwork. Everything is drawn at `CARD_SCALE` times the CSS
+# size, so the images print sharply.
+import logging
+
+from PIL import Image, ImageDraw, ImageFont
+
+from . import parallel
+
+# Card dimensions from `cards.css`, in CSS pixels
+CARD_WIDTH = 360
+CARD_HEIGHT = 320
+ART_SIZE = 180
+LABELS_LEFT = 10
+LABELS_TOP = 186
+LABELS_WIDTH = 160
+
+# Rendered pixels per CSS pixel
+CARD_SCALE = 2
+
+# Font sizes and colors from `cards.css` (1pt = 4/3 CSS px)
+SONG_FONT_SIZE = 11 * 4 / 3
+TEXT_FONT_SIZE = 9 * 4 / 3
+SMALL_FONT_SIZE = 7 * 4 / 3
+TEXT_COLOR = (0, 0, 0)
+SMALL_COLOR = (0x99, 0x99, 0x99)
+
+# Candidate font files, in order of preference
+FONT_NAMES = ['Helvetica', 'Arial', 'DejaVuSans']
+BOLD_FONT_NAMES = ['Helvetica-Bold', 'Arial Bold', 'DejaVuSans-Bold']
+
+_fonts = {}
+
+
+def px(value):
+    return int(round(value * CARD_SCALE))
+
+
+# Return the first available font of the given size, falling back on Pillow's default font
+# (which can only be loaded at a given size from Pillow 10.1 on; older versions only have a
+# small bitmap font, which the labels can't be laid out with)
+def load_font(size, bold=False):
+    key = (size, bold)
+    if key not in _fonts:
+        font = None
+        for name in (BOLD_FONT_NAMES if bold else FONT_NAMES):
+            try:
+                font = ImageFont.truetype(name, px(size))
+                break
+            except OSError:
+                continue
+        if font is None:
+            font = ImageFont.load_default(px(size))
+        _fonts[key] = font
+    return _fonts[key]
+
+
+# Return the card artwork scaled to fit the art box, like `object-fit: contain` with
+# `object-position: center top`
+def fit_art(art_file):
+    size = px(ART_SIZE)
+    box = Image.new('RGB', (size, size), 'white')
+    try:
+        art = Image.open(art_file)
+        art.draft('RGB', (size, size))
+        art = art.convert('RGBA')
+    except (OSError, ValueError) as e:
+        logging.info('Could not read artwork %s: %s' % (art_file, e))
+        return box
+    ratio = min(size / art.width, size / art.height)
+    art = art.resize((max(1, round(art.width * ratio)), max(1, round(art.height * ratio))), Image.LANCZOS)
+    box.paste(art, ((size - art.width) // 2, 0), art)
+    return box
+
+
+# Split a label made of (text, font, color) runs into lines no wider than `width`,
+# breaking between words
+def wrap_runs(draw, runs, width):
+    lines = [[]]
+    line_width = 0
+    for text, font, color in runs:
+        for word in text.split():
+            word_width = draw.textlength(word, font=font)
+            space = draw.textlength(' ', font=font)
+            if lines[-1] and line_width + space + word_width > width:
+                lines.append([])
+                line_width = 0
+            if lines[-1]:
+                line_width += space
+            lines[-1].append((word, font, color))
+            line_width += word_width
+    return [line for line in lines if line]
+
+
+# Draw a label centered in the labels column, starting at `y`. Returns the y position
+# below the label.
+def draw_label(draw, y, runs):
+    left = px(LABELS_LEFT)
+    width = px(LABELS_WIDTH)
+    for line in wrap_runs(draw, runs, width):
+        line_width = sum(draw.textlength(word, font=font) for word, font, _ in line)
+        line_width += sum(draw.textlength(' ', font=font) for _, font, _ in line[1:])
+        height = max(font.size for _, font, _ in line)
+        x = left + (width - line_width) / 2
+        for i, (word, font, color) in enumerate(line):
+            if i:
+                x += draw.textlength(' ', font=font)
+            # align the runs of a line on a common baseline
+            draw.text((x, y + height), word, font=font, fill=color, anchor='ls')
+            x += draw.textlength(word, font=font)
+        y += round(height * 1.2)
+    return y
+
+
+# Render one card PNG. `job` is a tuple of
+# (output file, artwork file, QR code file, song, artist, album), with the same
+# label rules as `card_content_html` in qrgen.
+def render_card(job):
+    (outfile, art_file, qr_file, song, artist, album) = job
+
+    card = Image.new('RGB', (px(CARD_WIDTH), px(CARD_HEIGHT)), 'white')
+    card.paste(fit_art(art_file), (0, 0))
+    with Image.open(qr_file) as qr:
+        # nearest neighbour keeps the QR modules sharp
+        qr = qr.convert('RGB').resize((px(ART_SIZE), px(ART_SIZE)), Image.NEAREST)
+        card.paste(qr, (px(ART_SIZE), 0))
+
+    draw = ImageDraw.Draw(card)
+    text_font = load_font(TEXT_FONT_SIZE)
+    small_font = load_font(SMALL_FONT_SIZE)
+    y = px(LABELS_TOP + 12)
+    y = draw_label(draw, y, [(song or album, load_font(SONG_FONT_SIZE, bold=True), TEXT_COLOR)])
+    if artist:
+        y = draw_label(draw, y + px(10), [('par', small_font, SMALL_COLOR), (artist, text_font, TEXT_COLOR)])
+    if album and song:
+        draw_label(draw, y + px(10), [('de', small_font, SMALL_COLOR), (album, text_font, TEXT_COLOR)])
+
+    card.save(outfile)
+    return outfile
+
+
+# Render card PNGs on a pool of worker processes (`pool`, or one process per core by default)
+def render_cards(jobs, workers=None, pool=None):
+    return parallel.map_jobs(render_card, jobs, workers, pool)
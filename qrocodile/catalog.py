@@ -0,0 +1,238 @@
+# Local SQLite catalog of library items, used to search for card candidates offline.
+#
+# Items are stored as the card input lines produced by the `--list-library-*` and
+# `--sync-library` exports (e.g. `alb:A:ALBUM/...$Phoenix$Wolfgang Amadeus Phoenix$/getaa?...`),
+# alongside their artist, album, and title for full-text search.
+import base64
+import hashlib
+import logging
+import sqlite3
+import time
+
+# Default filename of the catalog database
+CATALOG_FILE = 'catalog.db'
+
+# Prefix of short-ID card codes, e.g. `ID:K3J5MZ2Q`
+SHORT_ID_PREFIX = 'ID:'
+
+# Number of base32 digest characters in a short ID (40 bits). Longer IDs are only used
+# when the shorter one is already taken by another payload.
+SHORT_ID_LENGTH = 8
+
+# Card input line prefixes and the kind of item they describe
+LINE_KINDS = {'alb:': 'album', 'trk:': 'track', 'pl:': 'playlist'}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    line TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    album TEXT NOT NULL,
+    title TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS short_ids (
+    short_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS artist_tracks (
+    artist_uri TEXT PRIMARY KEY,
+    track_uris TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+'''
+
+# Full-text index over the items table, kept in sync by triggers
+FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    artist, album, title, content='items', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts(rowid, artist, album, title) VALUES (new.id, new.artist, new.album, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts(items_fts, rowid, artist, album, title)
+        VALUES ('delete', old.id, old.artist, old.album, old.title);
+END;
+'''
+
+
+# Open (and create, if needed) the catalog database. Full-text search is only available
+# if SQLite was built with FTS5; otherwise searches fall back to substring matching.
+def open_catalog(path=CATALOG_FILE):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    try:
+        conn.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError:
+        logging.info('SQLite has no FTS5 support, catalog searches will be slower')
+    conn.commit()
+    return conn
+
+
+def has_fts(conn):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone()
+    return row is not None
+
+
+# Split a card input line into the fields stored in the catalog. Returns None for lines
+# that don't describe a library item (e.g. the `album_uuid_prefix:` header), and for
+# malformed ones.
+def parse_line(line):
+    line = line.strip()
+    for prefix, kind in LINE_KINDS.items():
+        if line.startswith(prefix):
+            break
+    else:
+        return None
+
+    xlist = line.split('$')
+    try:
+        if kind == 'album':
+            # alb:[hsh:]id$artist$title$art
+            artist, album, title = xlist[1], xlist[2], ''
+        elif kind == 'track':
+            # trk:uri$artist$title$album$art
+            artist, album, title = xlist[1], xlist[3], xlist[2]
+        else:
+            # pl:uri$title
+            artist, album, title = '', '', xlist[1]
+    except IndexError:
+        logging.warning('Skipping %s line with missing fields: %s' % (kind, line))
+        return None
+    return {'line': line, 'kind': kind, 'artist': artist, 'album': album, 'title': title}
+
+
+# Add card input lines to the catalog, ignoring lines that are already in it.
+# Returns the number of items added.
+def add_lines(conn, lines):
+    added = 0
+    for line in lines:
+        item = parse_line(line)
+        if item is None:
+            continue
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO items (line, kind, artist, album, title) '
+            'VALUES (:line, :kind, :artist, :album, :title)', item)
+        added += cursor.rowcount
+    conn.commit()
+    return added
+
+
+# Remove card input lines from the catalog. Returns the number of items removed.
+def remove_lines(conn, lines):
+    removed = 0
+    for line in lines:
+        cursor = conn.execute('DELETE FROM items WHERE line = ?', (line.strip(),))
+        removed += cursor.rowcount
+    conn.commit()
+    return removed
+
+
+# Turn a free-text search term into an FTS5 query matching every word as a prefix,
+# e.g. `wolfgang pho` -> `"wolfgang"* "pho"*`.
+def fts_query(term):
+    return ' '.join('"{0}"*'.format(word.replace('"', '""')) for word in term.split())
+
+
+# Return the card input lines of the catalog items whose artist, album, or title match
+# every word of `term`, best matches first. `kind` limits the results to 'album',
+# 'track', or 'playlist' items.
+def search(conn, term, kind=None, limit=None):
+    params = []
+    if has_fts(conn) and term.split():
+        sql = ('SELECT items.line FROM items_fts JOIN items ON items.id = items_fts.rowid '
+               'WHERE items_fts MATCH ?')
+        params.append(fts_query(term))
+        order = ' ORDER BY items_fts.rank'
+    else:
+        sql = 'SELECT line FROM items WHERE 1'
+        for word in term.split():
+            sql += " AND (artist || ' ' || album || ' ' || title) LIKE ?"
+            params.append('%' + word + '%')
+        order = ' ORDER BY artist, album, title'
+    if kind:
+        sql += ' AND kind = ?'
+        params.append(kind)
+    sql += order
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+# Return the short-ID card code for a payload (the code qrplay would otherwise have to
+# read from the card, e.g. `alb:A:ALBUM/...` or `spotify:album:...`), registering it in the
+# catalog if needed.
+# Short IDs are a truncated base32 digest of the payload, so they only use characters from
+# the QR alphanumeric set and encode in the smallest QR versions. If the truncated digest
+# is already taken by a different payload, a longer prefix of the digest is used.
+def short_id(conn, payload):
+    row = conn.execute('SELECT short_id FROM short_ids WHERE payload = ?', (payload,)).fetchone()
+    if row is not None:
+        return SHORT_ID_PREFIX + row[0]
+
+    digest = base64.b32encode(hashlib.sha1(payload.encode()).digest()).decode('ascii').rstrip('=')
+    for length in range(SHORT_ID_LENGTH, len(digest) + 1):
+        candidate = digest[:length]
+        row = conn.execute('SELECT payload FROM short_ids WHERE short_id = ?', (candidate,)).fetchone()
+        if row is None:
+            conn.execute('INSERT INTO short_ids (short_id, payload) VALUES (?, ?)', (candidate, payload))
+            conn.commit()
+            return SHORT_ID_PREFIX + candidate
+        logging.info('Short ID %s already used by %s, trying a longer one' % (candidate, row[0]))
+    raise ValueError('Can\'t find a free short ID for ' + payload)
+
+
+# Return the payload registered for a short-ID card code, or None if it is unknown.
+def resolve_short_id(conn, code):
+    row = conn.execute('SELECT payload FROM short_ids WHERE short_id = ?',
+                       (code[len(SHORT_ID_PREFIX):],)).fetchone()
+    return row[0] if row is not None else None
+
+
+# Return all registered short IDs, as a dict of card code -> payload
+def short_id_codes(conn):
+    rows = conn.execute('SELECT short_id, payload FROM short_ids')
+    return {SHORT_ID_PREFIX + code: payload for code, payload in rows}
+
+
+# Market the top tracks of artist cards are picked for, unless `spotify_market` is set in
+# my_defaults.txt
+DEFAULT_MARKET = 'US'
+
+
+# Top tracks of artist cards are stored (and published to the catalog service) as the
+# space-separated list of their Spotify track URIs
+def pack_track_uris(track_uris):
+    return ' '.join(track_uris)
+
+
+def unpack_track_uris(packed):
+    return packed.split()
+
+
+# Store the top tracks of a Spotify artist, as a list of track URIs
+def set_artist_tracks(conn, artist_uri, track_uris):
+    conn.execute('INSERT OR REPLACE INTO artist_tracks (artist_uri, track_uris, updated) VALUES (?, ?, ?)',
+                 (artist_uri, pack_track_uris(track_uris), time.time()))
+    conn.commit()
+
+
+# Return the stored top track URIs of a Spotify artist, or None if there are none
+def artist_tracks(conn, artist_uri):
+    row = conn.execute('SELECT track_uris FROM artist_tracks WHERE artist_uri = ?', (artist_uri,)).fetchone()
+    return unpack_track_uris(row[0]) if row is not None else None
+
+
+# Return the stored top tracks of all artists, as a dict of artist URI -> packed track URIs
+def artist_track_codes(conn):
+    return dict(conn.execute('SELECT artist_uri, track_uris FROM artist_tracks'))
+
+
+# Return the URIs of the artists whose top tracks were last stored before `updated_before`
+# (a time.time() timestamp)
+def stale_artists(conn, updated_before):
+    rows = conn.execute('SELECT artist_uri FROM artist_tracks WHERE updated < ? ORDER BY updated',
+                        (updated_before,))
+    return [row[0] for row in rows]
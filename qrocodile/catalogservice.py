@@ -0,0 +1,267 @@
+# A small HTTP service sharing the codes behind hashed and short-ID cards between the
+# machine running qrgen and any number of qrplay devices, so that the hashed_*.dat files
+# and catalog.db don't have to be copied to each of them by hand.
+#
+# qrgen publishes the codes it creates with `publish`. Each qrplay keeps a local replica
+# of all codes (`CatalogReplica`), refreshed with a conditional snapshot download, and
+# keeps playing cards from the replica when the service can't be reached.
+#
+# Endpoints:
+#   GET  /snapshot      all codes, as JSON {"version": n, "codes": {code: target}}
+#   GET  /codes/<code>  the target of one code (URL-quoted), as text
+#   POST /codes         add or replace codes, given as a JSON object {code: target}
+# Both GET endpoints send an ETag, and answer 304 Not Modified to a request whose
+# If-None-Match header matches it.
+#
+# The GET endpoints are open to anyone who can reach the service. If the service is given
+# a token (`catalog_token` in my_defaults.txt), POST requests must send it as
+# `Authorization: Bearer <token>`; without one, only run the service on a trusted network,
+# as anyone on it could change what the cards play.
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+# File the service keeps the published codes in
+SERVICE_FILE = 'catalog_service.db'
+
+# File qrplay keeps its replica of the published codes in
+REPLICA_FILE = 'catalog_replica.json'
+
+DEFAULT_ADDRESS = '0.0.0.0:8765'
+
+# Timeout of qrplay's requests, in seconds (short, so that a scanned card is played from
+# the replica without a long wait when the service is down)
+REQUEST_TIMEOUT = 3
+
+# Timeout of qrgen's publish requests, in seconds
+PUBLISH_TIMEOUT = 60
+
+# Largest POST body accepted, in bytes (publishing tens of thousands of codes takes a few MB)
+MAX_PUBLISH_BYTES = 16 * 1024 * 1024
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS codes (
+    code TEXT PRIMARY KEY,
+    target TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+
+# The published codes, kept in SQLite. The version goes up with every publish that
+# changes anything, and is used as the ETag of the snapshot.
+class CodeStore:
+    def __init__(self, path=SERVICE_FILE):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        # (version, JSON body) of the last snapshot built
+        self.cached_snapshot = (None, None)
+
+    def version(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def get(self, code):
+        with self.lock:
+            row = self.conn.execute('SELECT target FROM codes WHERE code = ?', (code,)).fetchone()
+        return row[0] if row else None
+
+    # Add or replace codes, and return the new version
+    def publish(self, codes):
+        with self.lock, self.conn:
+            changed = 0
+            for code, target in codes.items():
+                changed += self.conn.execute(
+                    'INSERT INTO codes (code, target) VALUES (?, ?) '
+                    'ON CONFLICT (code) DO UPDATE SET target = excluded.target WHERE target != excluded.target',
+                    (code, target)).rowcount
+            if changed:
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('version', 1) "
+                                  "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+            logging.info('Published %d codes, %d changed' % (len(codes), changed))
+            return self.version()
+
+    # Return the version and the JSON body of the snapshot of all codes
+    def snapshot(self):
+        with self.lock:
+            version = self.version()
+            if self.cached_snapshot[0] != version:
+                codes = dict(self.conn.execute('SELECT code, target FROM codes'))
+                body = json.dumps({'version': version, 'codes': codes}).encode('utf-8')
+                self.cached_snapshot = (version, body)
+            return self.cached_snapshot
+
+
+def code_etag(target):
+    return '"{0}"'.format(hashlib.sha1(target.encode('utf-8')).hexdigest()[:16])
+
+
+class CatalogHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logging.info('%s %s' % (self.address_string(), format % args))
+
+    def send(self, status, content_type, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Answer 304 Not Modified if the request's If-None-Match header matches `etag`
+    def not_modified(self, etag):
+        header = self.headers.get('If-None-Match')
+        if not header or (header.strip() != '*' and etag not in [tag.strip() for tag in header.split(',')]):
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.end_headers()
+        return True
+
+    def do_GET(self):
+        store = self.server.store
+        if self.path == '/snapshot':
+            version, body = store.snapshot()
+            etag = '"v{0}"'.format(version)
+            if not self.not_modified(etag):
+                self.send(200, 'application/json', body, etag)
+        elif self.path.startswith('/codes/'):
+            target = store.get(unquote(self.path[len('/codes/'):]))
+            if target is None:
+                self.send(404, 'text/plain', b'unknown code')
+                return
+            etag = code_etag(target)
+            if not self.not_modified(etag):
+                self.send(200, 'text/plain; charset=utf-8', target.encode('utf-8'), etag)
+        else:
+            self.send(404, 'text/plain', b'not found')
+
+    # Return True if the request is allowed to publish codes
+    def authorized(self):
+        token = self.server.token
+        if not token:
+            return True
+        header = self.headers.get('Authorization', '')
+        return hmac.compare_digest(header.encode('utf-8'), ('Bearer ' + token).encode('utf-8'))
+
+    def do_POST(self):
+        if self.path != '/codes':
+            self.send(404, 'text/plain', b'not found')
+            return
+        if not self.authorized():
+            self.send(401, 'text/plain', b'missing or wrong token')
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send(400, 'text/plain', b'bad Content-Length')
+            return
+        if length > MAX_PUBLISH_BYTES:
+            self.send(413, 'text/plain', b'too many codes in one request')
+            return
+        try:
+            codes = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(codes, dict) or not all(isinstance(v, str) for v in codes.values()):
+                raise ValueError('expected a JSON object of strings')
+        except ValueError as e:
+            self.send(400, 'text/plain', str(e).encode('utf-8'))
+            return
+        version = self.server.store.publish(codes)
+        self.send(200, 'application/json', json.dumps({'version': version}).encode('utf-8'))
+
+
+# Return a server for the service listening on `address` ('host:port'), with its codes
+# stored in `path`, and only accepting codes published with `token` if one is given.
+# (Call `serve_forever()` to run it.)
+def make_server(address=DEFAULT_ADDRESS, path=SERVICE_FILE, token=None):
+    host, _, port = address.rpartition(':')
+    server = ThreadingHTTPServer((host, int(port)), CatalogHandler)
+    server.daemon_threads = True
+    server.store = CodeStore(path)
+    server.token = token
+    return server
+
+
+# Publish `codes` ({code: target}) to the service at `url`, and return the new version
+def publish(url, codes, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = 'Bearer ' + token
+    request = urllib.request.Request(url.rstrip('/') + '/codes', data=json.dumps(codes).encode('utf-8'),
+                                     headers=headers, method='POST')
+    with urllib.request.urlopen(request, timeout=PUBLISH_TIMEOUT) as response:
+        return json.loads(response.read().decode('utf-8'))['version']
+
+
+# qrplay's local copy of the published codes, saved to `path` so that it survives
+# restarts and outages of the service
+class CatalogReplica:
+    def __init__(self, url, path=REPLICA_FILE):
+        self.url = url.rstrip('/')
+        self.path = path
+        self.etag = None
+        self.codes = {}
+        # (qrplay also syncs the replica from a background thread)
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                replica = json.load(f)
+            self.etag = replica['etag']
+            self.codes = replica['codes']
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'etag': self.etag, 'codes': self.codes}, f)
+        os.replace(tmp, self.path)
+
+    # Bring the replica up to date, downloading the snapshot only if it changed since the
+    # last sync. Returns False if the service couldn't be reached.
+    def sync(self):
+        with self.lock:
+            return self.sync_locked()
+
+    def sync_locked(self):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        request = urllib.request.Request(self.url + '/snapshot', headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                snapshot = json.loads(response.read().decode('utf-8'))
+                etag = response.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return True
+            logging.info('Catalog service error, using local replica: %s' % (e))
+            return False
+        except (OSError, ValueError) as e:
+            # (URLError and timeouts are OSErrors)
+            logging.info('Catalog service unreachable, using local replica: %s' % (e))
+            return False
+        self.etag = etag
+        self.codes = snapshot['codes']
+        self.save()
+        logging.info('Catalog replica updated to version %d (%d codes)' % (snapshot['version'], len(self.codes)))
+        return True
+
+    # Return the target of `code`, or None if it is unknown. A code missing from the
+    # replica may belong to a card published since the last sync, so the replica is
+    # synced once before giving up.
+    def resolve(self, code):
+        if code not in self.codes:
+            self.sync()
+        return self.codes.get(code)
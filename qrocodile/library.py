@@ -0,0 +1,121 @@
+# Helpers for reading card metadata out of the Sonos music library.
+#
+# The library listings only need a handful of fields per item (title, creator,
+# album, URI and album art URI), so rather than building SoCo objects and
+# re-serializing them to DIDL-Lite, these helpers read the fields straight from
+# the DIDL-Lite document returned by a ContentDirectory browse, in one pass.
+import xml.etree.ElementTree as ET
+
+# Namespaces used in DIDL-Lite documents returned by the Sonos ContentDirectory
+DIDL_NS = {
+    'didl': 'urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'upnp': 'urn:schemas-upnp-org:metadata-1-0/upnp/',
+}
+
+# ContentDirectory object ids of the library containers used by qrgen
+LIBRARY_CONTAINERS = {
+    'albums': 'A:ALBUM',
+    'tracks': 'A:TRACKS',
+    'playlists': 'A:PLAYLISTS',
+    'sonos_playlists': 'SQ:',
+}
+
+# Number of items requested per browse call (the speaker may return fewer)
+BROWSE_PAGE_SIZE = 1000
+
+
+# Return the card fields of a single DIDL-Lite <item> or <container> element.
+# Fields are looked up by tag name, so the order of the child elements does not matter.
+def element_fields(element):
+    return {
+        'title': element.findtext('dc:title', '', DIDL_NS),
+        'uri': element.findtext('didl:res', '', DIDL_NS),
+        'creator': element.findtext('dc:creator', '', DIDL_NS),
+        'album': element.findtext('upnp:album', '', DIDL_NS),
+        'art_uri': element.findtext('upnp:albumArtURI', '', DIDL_NS),
+    }
+
+
+# Parse a raw DIDL-Lite result string and return the card fields of every item in it.
+def parse_didl_result(didl):
+    return [element_fields(element) for element in ET.fromstring(didl)]
+
+
+# Return the card fields of a SoCo DIDL object (e.g. an item of a `SearchResult`),
+# using the same keys as `element_fields`.
+def object_fields(item):
+    resources = getattr(item, 'resources', None)
+    return {
+        'title': item.title or '',
+        'uri': resources[0].uri if resources else '',
+        'creator': getattr(item, 'creator', None) or '',
+        'album': getattr(item, 'album', None) or '',
+        'art_uri': getattr(item, 'album_art_uri', None) or '',
+    }
+
+
+# Ensure an album art URI from the library is absolute. This is the same as SoCo's
+# `MusicLibrary.build_album_art_full_uri`, but only needs the speaker's IP address.
+def build_album_art_full_uri(speaker_ip, url):
+    if not url.startswith(('http:', 'https:')):
+        url = 'http://' + speaker_ip + ':1400' + url
+    return url
+
+
+# Browse one page of a library container. Returns the raw ContentDirectory response,
+# or None if the container does not exist on the speaker.
+def browse_page(content_directory, object_id, start, count):
+    # (soco is imported here, so that the parsing helpers can be used without it)
+    from soco.exceptions import SoCoUPnPException
+    try:
+        return content_directory.Browse([
+            ('ObjectID', object_id),
+            ('BrowseFlag', 'BrowseDirectChildren'),
+            ('Filter', '*'),
+            ('StartingIndex', start),
+            ('RequestedCount', count),
+            ('SortCriteria', '')
+        ])
+    except SoCoUPnPException as e:
+        # 'No such object', e.g. a search that matches nothing
+        if e.error_code == '701':
+            return None
+        raise
+
+
+# Yield the card fields of every item in a library container (one of `LIBRARY_CONTAINERS`),
+# paging through the browse results. `search_term` performs the same fuzzy search as
+# SoCo's `MusicLibrary.get_music_library_information`.
+def browse_library(content_directory, container, search_term=None):
+    object_id = container
+    if search_term is not None:
+        from soco.utils import url_escape_path
+        object_id += ':' + url_escape_path(search_term)
+
+    start = 0
+    while True:
+        response = browse_page(content_directory, object_id, start, BROWSE_PAGE_SIZE)
+        if response is None:
+            return
+        items = parse_didl_result(response['Result'])
+        for item in items:
+            yield item
+        start += len(items)
+        if not items or start >= int(response['TotalMatches']):
+            return
+
+
+# Return the ContentDirectory SystemUpdateID, which changes whenever anything in the
+# library (or the Sonos playlists) changes.
+def system_update_id(content_directory):
+    return int(content_directory.GetSystemUpdateID()['Id'])
+
+
+# Return the update id of a library container, without listing its contents.
+# Returns None if the container does not exist on the speaker.
+def container_update_id(content_directory, container):
+    response = browse_page(content_directory, container, 0, 1)
+    if response is None:
+        return None
+    return int(response['UpdateID'])
@@ -0,0 +1,35 @@
+# Runs jobs on a pool of worker processes, for the card image, artwork, and QR code
+# verification stages of qrgen.
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Return a pool of `workers` processes (one per core by default) to share between calls to
+# `map_jobs`, or None if a single worker is asked for. The worker processes are started
+# right away, so that they are forked before the caller starts any threads (forking a
+# process that runs threads can deadlock).
+def make_pool(workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return None
+    pool = ProcessPoolExecutor(max_workers=workers)
+    # (with the 'fork' start method, the first job starts all the workers)
+    pool.submit(int).result()
+    return pool
+
+
+# Return `func(job)` for each of `jobs`, in order, computed on `pool` (from `make_pool`) if
+# given, or else on a new pool of `workers` processes (one per core by default). With a
+# single worker, the jobs run in this process. `func` and the jobs must be picklable.
+def map_jobs(func, jobs, workers=None, pool=None):
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (workers * 4))
+    if pool is not None:
+        return list(pool.map(func, jobs, chunksize=chunksize))
+    if workers == 1:
+        return [func(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, jobs, chunksize=chunksize))
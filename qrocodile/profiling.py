@@ -0,0 +1,86 @@
+# Profiling hooks used by the `--profile` option of qrgen and qrplay.
+#
+# A `Profiler` collects a cProfile profile, plus the wall-clock time of each call to the
+# functions it instruments (the `process_*` functions of qrgen and the `handle_*`
+# functions of qrplay). `report` writes the profile to a pstats file, which can be
+# explored later with `python3 -m pstats FILE`, and prints a summary of the hot spots.
+import cProfile
+import functools
+import logging
+import pstats
+import sys
+import time
+
+# Number of functions listed in the hot spot summary
+TOP_FUNCTIONS = 20
+
+
+class Profiler:
+    def __init__(self, filename):
+        self.filename = filename
+        self.profile = cProfile.Profile()
+        self.enabled = False
+        self.collected = False
+        # Wall-clock spans by function name: [number of calls, total seconds, longest call]
+        self.spans = {}
+
+    def enable(self):
+        self.profile.enable()
+        self.enabled = True
+        self.collected = True
+
+    def disable(self):
+        self.profile.disable()
+        self.enabled = False
+
+    # Switch the profile on or off. This is used as a signal handler by qrplay, so a
+    # long-running scanner can be profiled for a while; the profile collected so far is
+    # reported each time it is switched off.
+    def toggle(self, *_):
+        if self.enabled:
+            self.disable()
+            logging.info('Profiling disabled')
+            self.report()
+        else:
+            logging.info('Profiling enabled')
+            self.enable()
+
+    # Replace the functions in `namespace` (a module's globals) whose names start with one
+    # of `prefixes` with wrappers recording their wall-clock time
+    def instrument(self, namespace, prefixes):
+        for name, func in list(namespace.items()):
+            if name.startswith(prefixes) and callable(func):
+                namespace[name] = self.span(func)
+
+    def span(self, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                span = self.spans.setdefault(func.__name__, [0, 0.0, 0.0])
+                span[0] += 1
+                span[1] += elapsed
+                span[2] = max(span[2], elapsed)
+
+        return timed
+
+    # Write the profile to `filename` and print the hot spots and the wall-clock spans
+    # (to stderr, so they don't mix with output meant to be redirected)
+    def report(self, out=None):
+        out = out or sys.stderr
+        if self.enabled:
+            self.disable()
+        if self.collected:
+            self.profile.dump_stats(self.filename)
+            print('Hot spots (full profile written to {0}):'.format(self.filename), file=out)
+            pstats.Stats(self.profile, stream=out).sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+        if self.spans:
+            print('Wall-clock time per call:', file=out)
+            print('  {0:<32} {1:>7} {2:>10} {3:>10} {4:>10}'.format('function', 'calls', 'total s', 'mean ms',
+                                                                   'max ms'), file=out)
+            for name, (calls, total, longest) in sorted(self.spans.items(), key=lambda s: -s[1][1]):
+                print('  {0:<32} {1:>7} {2:>10.3f} {3:>10.1f} {4:>10.1f}'.format(
+                    name, calls, total, total / calls * 1000, longest * 1000), file=out)
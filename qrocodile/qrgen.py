@@ -0,0 +1,1304 @@
+import logging
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import pickle
+import os.path
+import queue
+import shutil
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+from . import catalog, catalogservice, parallel, profiling
+from .library import (LIBRARY_CONTAINERS, browse_library, build_album_art_full_uri, container_update_id,
+                      system_update_id)
+
+# spotipy, soco, pyqrcode and Pillow (used by the `artwork` and `cardimage` modules) are
+# imported by the functions that need them, so that commands which don't use them (such as
+# `--search`) start quickly.
+
+LOG_FORMAT = '%(levelname)s %(asctime)s - %(message)s'
+logger = logging.getLogger()
+
+# Defaults loaded from my_defaults.txt, and the parsed command line arguments (set by `main()`)
+defaults = {}
+default_room = None
+args = None
+
+# The map of known commands from command_cards.txt, loaded on first use by `get_commands()`
+commands = None
+
+# set filenames for pickle of hashed library items
+hashed_tracks = 'hashed_tracks.dat'
+hashed_albums = 'hashed_albums.dat'
+
+# set filename for the library snapshot used by `--sync-library`
+library_snapshot = 'library_snapshot.json'
+
+# The speaker used to query the music library, resolved once per run by `get_speaker()`
+speaker = None
+
+# The Spotify client, set up on first use by `get_spotify()`
+sp = None
+
+# The catalog connection, opened on first use by `get_catalog()`
+catalog_conn = None
+
+# Hashed and short-ID codes created since they were last published, and the top tracks of
+# artist cards, to publish to the catalog service (see `--catalog-url`): card code -> what it
+# stands for
+published_codes = {}
+
+# Beginning and end of the HTML pages holding the cards
+HTML_HEADER = '''<html>
+<head>
+<meta charset="UTF-8">
+<link rel="stylesheet" href="cards.css">
+</head>
+<body>
+'''
+HTML_FOOTER = '''</body>
+</html>
+'''
+
+# Prefix of the content-hash filenames under which static assets are stored in out/
+ASSET_PREFIX = 'asset-'
+
+# Static assets stored in out/ by `static_asset`: filename in out/ by source path or URL
+static_assets = {}
+
+# QR codes written since they were last verified, for `--verify`: file -> (content,
+# version, error level)
+qr_codes = {}
+
+# Spotify metadata prefetched by `prefetch_spotify`, by URI
+spotify_cache = {}
+
+# Maximum number of items per request of the Spotify batch endpoints
+SPOTIFY_BATCH_SIZES = {'track': 50, 'album': 20, 'artist': 50}
+
+# Number of attempts made for a Spotify request that hits the rate limit
+SPOTIFY_MAX_ATTEMPTS = 5
+
+# Number of input lines turned into cards at a time. Each batch is finished (artwork
+# normalized, card images rendered, ...) while the next one is generated, and only one
+# batch waits to be finished, so memory use doesn't grow with the size of the input.
+# (A multiple of the Spotify batch sizes, so that metadata is fetched in full batches.)
+CARD_BATCH_SIZE = 200
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(
+        description='Generates an HTML page containing cards with embedded QR codes that can be interpreted by '
+                    '`qrplay`.')
+    arg_parser.add_argument('--input', help='the file containing the list of albums, playlists, and tracks to generate')
+    arg_parser.add_argument('--generate-images', action='store_true',
+                            help='also generate an individual PNG image (out/<index>card.png) for each card')
+    arg_parser.add_argument('--image-workers', type=int,
+                            help='number of processes used to resize artwork and render card images '
+                                 '(defaults to the number of cores)')
+    arg_parser.add_argument('--list-library-albums', action='store_true', help='list all available library albums')
+    arg_parser.add_argument('--list-library-playlists', action='store_true',
+                            help='list all available library playlists')
+    arg_parser.add_argument('--list-library-tracks', const='all', action='store', nargs='?',
+                            help='list all library tracks matching given search term')
+    arg_parser.add_argument('--sync-library', action='store_true',
+                            help='update the local library snapshot and list library items added or removed since the '
+                                 'last sync')
+    arg_parser.add_argument('--catalog-import', nargs='+', metavar='FILE',
+                            help='add the items of library export files (e.g. out/all_albums.txt) to the local catalog')
+    arg_parser.add_argument('--search', metavar='TERM',
+                            help='search the local catalog by artist, album, and title, and print matching input lines')
+    arg_parser.add_argument('--search-kind', choices=['album', 'track', 'playlist'],
+                            help='only return catalog items of this kind')
+    arg_parser.add_argument('--search-limit', type=int, help='maximum number of catalog search results')
+    arg_parser.add_argument('--short-ids', action='store_true',
+                            help='encode cards as short IDs registered in the local catalog, for simpler QR codes '
+                                 '(qrplay needs a copy of catalog.db to play them)')
+    arg_parser.add_argument('--spotify-username', default=defaults.get('default_spotify_user'),
+                            help='the username used to set up Spotify access '
+                                 '(only needed if you want to generate cards for Spotify tracks)')
+    arg_parser.add_argument('--zones', action='store_true',
+                            help='generate out/zones.html with cards for all available Sonos zones')
+    arg_parser.add_argument('--commands', action='store_true',
+                            help='generate out/commands.html with cards for all commands defined in command_cards.txt')
+    arg_parser.add_argument('--speaker-ip', default=defaults.get('speaker_ip'),
+                            help='IP address of the Sonos speaker used to query the music library; skips discovery '
+                                 '(defaults to `speaker_ip` in my_defaults.txt)')
+    arg_parser.add_argument('--cards-per-page', type=int,
+                            help='split the card sheet into several HTML files of this many cards each, '
+                                 'linked from a small index page')
+    arg_parser.add_argument('--set-defaults', action='store_true', help='set defaults to be written to my_defaults.txt')
+    arg_parser.add_argument('--verify', action='store_true',
+                            help='check that every generated QR code decodes quickly when scanned the way qrplay '
+                                 'scans it, re-render the codes that don\'t with a larger version, and write the '
+                                 'results to out/verify.csv (needs pyzbar or zbarimg)')
+    arg_parser.add_argument('--catalog-url', default=defaults.get('catalog_url'),
+                            help='URL of the catalog service (e.g. http://192.168.1.10:8765) that the codes of hashed '
+                                 'and short-ID cards are published to (defaults to `catalog_url` in my_defaults.txt)')
+    arg_parser.add_argument('--publish-catalog', action='store_true',
+                            help='publish all hashed and short-ID codes created so far to the catalog service')
+    arg_parser.add_argument('--serve-catalog', nargs='?', const=catalogservice.DEFAULT_ADDRESS, metavar='HOST:PORT',
+                            help='run the catalog service shared by qrplay devices (on {0} by default), storing the '
+                                 'codes in {1}'.format(catalogservice.DEFAULT_ADDRESS, catalogservice.SERVICE_FILE))
+    arg_parser.add_argument('--profile', nargs='?', const='qrgen.prof', metavar='FILE',
+                            help='profile the run, write the profile to FILE (qrgen.prof by default), and print the '
+                                 'hot spots and the time spent per card on exit (artwork and card images processed '
+                                 'in worker processes are not included)')
+    return arg_parser
+
+
+# Load my_defaults.txt and parse the command line `argv` (defaults to sys.argv)
+def parse_args(argv=None):
+    global defaults, default_room, args
+    with open('my_defaults.txt', 'r') as f:
+        defaults = json.load(f)
+    default_room = defaults['default_room']
+    logging.info('Imported defaults: %s' % defaults)
+    args = build_arg_parser().parse_args(argv)
+    logging.info('Arguments: %s' % args)
+    return args
+
+
+# Return the map of known commands, loading command_cards.txt on first use
+def get_commands():
+    global commands
+    if commands is None:
+        with open('command_cards.txt') as f:
+            commands = json.load(f)
+    return commands
+
+
+# Return the Spotify client, setting up Spotify access on first use
+def get_spotify():
+    global sp
+    if sp is None:
+        if not args.spotify_username:
+            raise ValueError('Must configure Spotify API access first using `--spotify-username`')
+        import spotipy
+        import spotipy.util as util
+        scope = 'user-library-read'
+        token = util.prompt_for_user_token(args.spotify_username, scope, client_id=defaults['SPOTIPY_CLIENT_ID'],
+                                           client_secret=defaults['SPOTIPY_CLIENT_SECRET'],
+                                           redirect_uri=defaults['SPOTIPY_REDIRECT_URI'])
+        if not token:
+            raise ValueError('Can\'t get Spotify token for ' + args.spotify_username)
+        sp = spotipy.Spotify(auth=token)
+    return sp
+
+
+def set_defaults():
+    import soco
+
+    # collect items to use with qrplay: spotify username, default sonos zone
+    defaults = {}
+    defaults.update({'default_spotify_user': input('Spotify username: ')})
+    sonos_zones = []
+    for zone in list(soco.discover()):
+        sonos_zones.append(zone)
+        logging.info('Zone found: %s' % (zone.player_name))
+    defaults.update({'default_room': input('Default Sonos zone/room: ')})
+    # cache the IP of the default zone so later runs can skip discovery
+    for zone in sonos_zones:
+        if zone.player_name == defaults['default_room']:
+            defaults.update({'speaker_ip': zone.ip_address})
+    current_path = os.getcwd()
+    output_file_defaults = os.path.join(current_path, 'my_defaults.txt')
+    file = open(output_file_defaults, 'w')
+    json.dump(defaults, file, indent=2)
+    file.close()
+
+
+# Return the SoCo instance used to query the music library. Discovery happens at most once
+# per run, and not at all if a speaker IP is given with `--speaker-ip` or cached in my_defaults.txt.
+def get_speaker():
+    global speaker
+    if speaker is None:
+        import soco
+        if args.speaker_ip:
+            speaker = soco.SoCo(args.speaker_ip)
+        else:
+            speaker = soco.discovery.by_name(default_room)
+            if speaker is None:
+                raise ValueError('Can\'t find Sonos speaker ' + default_room)
+        logging.info('Using speaker at %s' % (speaker.ip_address))
+    return speaker
+
+
+def get_zones():
+    import soco
+
+    # create a list with all available zones
+    sonos_zones = []
+    for zone in list(soco.discover()):
+        sonos_zones.append(zone)
+    logging.info('List of zones: %s' % (sonos_zones))
+
+    # copy cards.css to /out folder
+    shutil.copyfile('cards.css', 'out/cards.css')
+    artimg = static_asset('sonos_360.png')
+
+    sheet = CardSheet('zones.html', args.cards_per_page)
+    for n in sonos_zones:
+        qrout = 'out/' + n.player_name + '_qr.png'
+        qrimg = n.player_name + '_qr.png'
+        write_qr('changezone:' + n.player_name, qrout)
+        # generate html
+        html = ''
+        html += '  <img src="' + artimg + '" class="art"/>\n'
+        html += '  <img src="' + qrimg + '" class="qrcode"/>\n'
+        html += '  <div class="labels">\n'
+        html += '    <p class="zone">' + n.player_name + '</p>\n'
+        html += '  </div>\n'
+        sheet.add_card(html)
+    sheet.close()
+
+    if args.verify:
+        verify_qr_codes(qr_codes)
+
+
+# Return the card input line for a library playlist, album, or track (as read by `browse_library`).
+def playlist_line(playlist):
+    return 'pl:{}${}'.format(playlist['uri'], playlist['title'])
+
+
+def album_line(album):
+    album_id = album['uri'].split('#', 1)[1]
+    return 'alb:{}${}${}${}'.format(album_id, album['creator'], album['title'], album['art_uri'])
+
+
+def track_line(track):
+    return 'trk:{}${}${}${}${}'.format(track['uri'], track['creator'], track['title'], track['album'],
+                                       track['art_uri'])
+
+
+def list_library_playlists():
+    logging.info('Getting sonos and library playlists')
+    content_directory = get_speaker().contentDirectory
+    with open('out/all_playlists.txt', 'w') as f:
+        # Get sonos playlists, followed by imported playlists
+        for container in (LIBRARY_CONTAINERS['sonos_playlists'], LIBRARY_CONTAINERS['playlists']):
+            for playlist in browse_library(content_directory, container):
+                f.write(playlist_line(playlist) + '\n')
+    return
+
+
+def list_library_albums():
+    logging.info('Getting library albums')
+    content_directory = get_speaker().contentDirectory
+    with open('out/all_albums.txt', 'w') as f:
+        for i, album in enumerate(browse_library(content_directory, LIBRARY_CONTAINERS['albums'])):
+            logging.info('%s %s %s' % (album['creator'], album['title'], album['uri']))
+            # write uuid of sonos zone speaker for later use in playback of albums
+            if i == 0:
+                f.write('album_uuid_prefix: {}\n'.format(album['uri'].split('#')[0]))
+            f.write(album_line(album) + '\n')
+    return
+
+
+def list_library_tracks():
+    if args.list_library_tracks == 'all':
+        logging.info('Getting all library tracks.')
+        term = None
+    else:
+        term = args.list_library_tracks
+        logging.info('Getting all library trackst that match search term \'%s\'.' % (args.list_library_tracks))
+    content_directory = get_speaker().contentDirectory
+    with open('out/all_tracks.txt', 'w') as f:
+        for track in browse_library(content_directory, LIBRARY_CONTAINERS['tracks'], search_term=term):
+            f.write(track_line(track) + '\n')
+
+
+# Bring the local library snapshot up to date and write the added and removed items
+# to out/library_added.txt and out/library_removed.txt (in the same format as the
+# `--list-library-*` exports, so they can be used as `--input` directly).
+# Nothing is listed if the SystemUpdateID hasn't changed, and only the containers
+# whose update id changed since the last sync are listed again.
+def sync_library():
+    content_directory = get_speaker().contentDirectory
+
+    snapshot = {'system_update_id': None, 'containers': {}}
+    if os.path.exists(library_snapshot):
+        with open(library_snapshot, 'r') as r:
+            snapshot = json.load(r)
+
+    added = []
+    removed = []
+    update_id = system_update_id(content_directory)
+    if update_id == snapshot['system_update_id']:
+        logging.info('Library unchanged since last sync (SystemUpdateID %d)' % (update_id))
+    else:
+        for name, to_line in synced_containers:
+            container_id = container_update_id(content_directory, LIBRARY_CONTAINERS[name])
+            previous = snapshot['containers'].get(name)
+            if previous and previous['update_id'] == container_id:
+                logging.info('Container %s unchanged (UpdateID %s)' % (name, container_id))
+                continue
+            logging.info('Container %s changed, fetching items' % (name))
+            items = list(browse_library(content_directory, LIBRARY_CONTAINERS[name]))
+            lines = [to_line(item) for item in items]
+            if name == 'albums' and items:
+                snapshot['album_uuid_prefix'] = items[0]['uri'].split('#')[0]
+            old_lines = previous['lines'] if previous else []
+            old_set = set(old_lines)
+            new_set = set(lines)
+            added += [line for line in lines if line not in old_set]
+            removed += [line for line in old_lines if line not in new_set]
+            snapshot['containers'][name] = {'update_id': container_id, 'lines': lines}
+        snapshot['system_update_id'] = update_id
+        with open(library_snapshot, 'w') as w:
+            json.dump(snapshot, w)
+
+    logging.info('Library sync: %d added, %d removed' % (len(added), len(removed)))
+    conn = catalog.open_catalog()
+    catalog.add_lines(conn, added)
+    catalog.remove_lines(conn, removed)
+    conn.close()
+    with open('out/library_added.txt', 'w') as f:
+        for line in added:
+            f.write(line + '\n')
+    with open('out/library_removed.txt', 'w') as f:
+        for line in removed:
+            f.write(line + '\n')
+
+
+# Add the items listed in library export files to the local catalog
+def import_catalog():
+    conn = catalog.open_catalog()
+    for filename in args.catalog_import:
+        with open(filename, 'r') as f:
+            added = catalog.add_lines(conn, f)
+        logging.info('Added %d items from %s to the catalog' % (added, filename))
+    conn.close()
+
+
+# Print the input lines of the catalog items matching the search term, ready to be
+# pasted (or redirected) into a card list file
+def search_catalog():
+    conn = catalog.open_catalog()
+    for line in catalog.search(conn, args.search, kind=args.search_kind, limit=args.search_limit):
+        print(line)
+    conn.close()
+
+
+# The library containers kept in the snapshot, and how their items are written out
+synced_containers = [
+    ('albums', album_line),
+    ('tracks', track_line),
+    ('sonos_playlists', playlist_line),
+    ('playlists', playlist_line),
+]
+
+
+# Publish codes ({card code: what it stands for}) to the catalog service
+def publish_codes(codes):
+    try:
+        version = catalogservice.publish(args.catalog_url, codes, defaults.get('catalog_token'))
+    except (OSError, ValueError) as e:
+        logging.warning('Could not publish %d codes to the catalog service at %s: %s '
+                        '(run `--publish-catalog` once it is reachable)' % (len(codes), args.catalog_url, e))
+        return
+    logging.info('Published %d codes to the catalog service (version %d)' % (len(codes), version))
+
+
+# Publish every hashed and short-ID code created so far (in hashed_*.dat and catalog.db),
+# and the stored top tracks of artist cards
+def publish_catalog():
+    if not args.catalog_url:
+        raise ValueError('Must configure the catalog service first using `--catalog-url`')
+    codes = {}
+    for hashed_file in (hashed_albums, hashed_tracks):
+        if os.path.exists(hashed_file):
+            with open(hashed_file, 'rb') as r:
+                codes.update(pickle.load(r))
+    codes.update(catalog.short_id_codes(get_catalog()))
+    codes.update(catalog.artist_track_codes(get_catalog()))
+    publish_codes(codes)
+
+
+# Run the catalog service until interrupted
+def serve_catalog():
+    token = defaults.get('catalog_token')
+    server = catalogservice.make_server(args.serve_catalog, token=token)
+    logging.info('Serving the catalog on %s' % (args.serve_catalog))
+    if not token:
+        logging.warning('No `catalog_token` set in my_defaults.txt: anyone who can reach the service can change '
+                        'what the cards play, so only run it on a trusted network')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# Return the catalog, opening it on first use
+def get_catalog():
+    global catalog_conn
+    if catalog_conn is None:
+        catalog_conn = catalog.open_catalog()
+    return catalog_conn
+
+
+# Return the code to encode on a card for the given payload: a short ID registered in the
+# catalog if `--short-ids` is set, otherwise the payload itself.
+def card_code(payload):
+    if args.short_ids:
+        code = catalog.short_id(get_catalog(), payload)
+        published_codes[code] = payload
+        return code
+    return payload
+
+
+# Return the QR encoding mode pyqrcode will use for `content`, and the length of the content
+# in that mode
+def qr_mode(content):
+    import pyqrcode
+    if content.isdigit():
+        return 'numeric', len(content)
+    if all(c in pyqrcode.tables.ascii_codes for c in content):
+        return 'alphanumeric', len(content)
+    return 'binary', len(content.encode('utf-8'))
+
+
+# Create a QR code using the smallest possible version (no smaller than `min_version`), and
+# the highest error correction level that still fits in that version. (The version is
+# picked from pyqrcode's capacity table, because building a code to find out is
+# comparatively slow.)
+def make_qr(content, min_version=1):
+    import pyqrcode
+    mode, length = qr_mode(content)
+    mode_num = pyqrcode.tables.modes[mode]
+
+    def fits(version, error):
+        return pyqrcode.tables.data_capacity[version][error][mode_num] >= length
+
+    smallest = next((version for version in range(min_version, 41) if fits(version, 'L')), None)
+    if smallest is None:
+        raise ValueError('Content too long for a QR code: ' + content)
+    error = next(error for error in ('H', 'Q', 'M', 'L') if fits(smallest, error))
+    return pyqrcode.create(content, error=error, version=smallest, mode=mode)
+
+
+# Write the QR code for `content` to the PNG file `qrout`
+def write_qr(content, qrout):
+    qr = make_qr(content)
+    logging.info('QR code for %s: version %d, error level %s' % (content, qr.version, qr.error))
+    qr.png(qrout, scale=6)
+    qr_codes[qrout] = (content, qr.version, qr.error)
+
+
+# Decode QR codes (`codes`, as collected in `qr_codes`) as qrplay's scanner would see them
+# (see the `verify` module). Codes that fail to decode or are slow to decode are re-rendered
+# with a larger version, which allows a higher error correction level, if that decodes better.
+# (The PNG scale makes no difference, as cards print codes in a box of fixed size.)
+# The results are written to out/verify.csv, or added to it if `append` is set. `pool` is a
+# pool of worker processes to verify on (see `parallel.make_pool`).
+def verify_qr_codes(codes, append=False, pool=None):
+    from . import verify
+
+    decoder = verify.find_decoder()
+    if decoder is None:
+        logging.warning('Can\'t verify QR codes: install pyzbar (and the zbar library) or zbar-tools')
+        return
+
+    def score(result):
+        (_, decoded, seconds) = result
+        slow = decoder == 'pyzbar' and seconds > verify.SLOW_DECODE_SECONDS
+        return decoded == verify.ATTEMPTS and not slow, decoded, -seconds if decoded else 0
+
+    results = {result[0]: result for result in verify.verify_all(
+        [(qrout, content, decoder) for qrout, (content, _, _) in codes.items()], workers=args.image_workers,
+        pool=pool)}
+    retry = [qrout for qrout, result in results.items() if not score(result)[0]]
+
+    # Render up to two larger versions of each code that needs it, and verify them together
+    alternatives = {}
+    for qrout in retry:
+        (content, version, _) = codes[qrout]
+        for min_version in range(version + 1, min(version + 2, 40) + 1):
+            qr = make_qr(content, min_version)
+            altout = '{0}-v{1}.png'.format(os.path.splitext(qrout)[0], qr.version)
+            qr.png(altout, scale=6)
+            alternatives[altout] = (qrout, qr.version, qr.error)
+    alt_results = verify.verify_all([(altout, codes[qrout][0], decoder)
+                                     for altout, (qrout, _, _) in alternatives.items()],
+                                    workers=args.image_workers, pool=pool)
+
+    rerendered = {}
+    for result in alt_results:
+        altout = result[0]
+        (qrout, version, error) = alternatives[altout]
+        if score(result) > score(results[qrout]):
+            os.replace(altout, qrout)
+            rerendered.setdefault(qrout, codes[qrout][1:])
+            codes[qrout] = (codes[qrout][0], version, error)
+            results[qrout] = (qrout,) + result[1:]
+        else:
+            os.remove(altout)
+
+    with open('out/verify.csv', 'a' if append else 'w', newline='') as f:
+        writer = csv.writer(f)
+        if not append:
+            writer.writerow(['file', 'code', 'version', 'error', 'decoded', 'attempts', 'decode_ms', 'status',
+                             'rerendered_from'])
+        for qrout, (content, version, error) in codes.items():
+            (_, decoded, seconds) = results[qrout]
+            ok = score(results[qrout])[0]
+            status = 'ok' if ok else ('slow' if decoded == verify.ATTEMPTS else 'failed')
+            was = '{0}-{1}'.format(*rerendered[qrout]) if qrout in rerendered else ''
+            writer.writerow([qrout, content, version, error, decoded, verify.ATTEMPTS,
+                             '{0:.2f}'.format(seconds * 1000), status, was])
+            if not ok:
+                logging.warning('QR code %s (%s) is %s to decode; shorter codes (e.g. `--short-ids`) scan more '
+                                'reliably' % (qrout, content, 'slow' if status == 'slow' else 'hard'))
+    logging.info('Verified %d QR codes: %d re-rendered, %d still slow or failing' % (
+        len(codes), len(rerendered), sum(1 for result in results.values() if not score(result)[0])))
+
+
+# Fetch artwork with `artwork.fetch_artwork` (imported here, as the artwork module needs Pillow)
+def fetch_artwork(url, artout):
+    from . import artwork
+    return artwork.fetch_artwork(url, artout)
+
+
+# Return the filename (in out/) of the artwork fetched for card `index`
+def card_art_filename(index):
+    return '{0}art.jpg'.format(index)
+
+
+# Store a static asset, such as a generic icon, in out/ once under a name derived from its
+# content, and return that name, so that all cards using the same image point to one copy.
+# `source` is a local path, or a URL that is downloaded once per run. Returns None if the
+# URL can't be fetched.
+def static_asset(source):
+    if source not in static_assets:
+        ext = os.path.splitext(urlparse(source).path)[1]
+        if urlparse(source).scheme in ('http', 'https'):
+            path = os.path.join('out', ASSET_PREFIX + 'download' + ext)
+            if not fetch_artwork(source, path):
+                os.remove(path)
+                static_assets[source] = None
+                return None
+        else:
+            path = source
+        with open(path, 'rb') as f:
+            name = ASSET_PREFIX + hashlib.sha1(f.read()).hexdigest()[:16] + ext
+        outfile = os.path.join('out', name)
+        if path != source:
+            os.replace(path, outfile)
+        elif not os.path.exists(outfile):
+            shutil.copyfile(path, outfile)
+        static_assets[source] = name
+    return static_assets[source]
+
+
+# Removes extra junk from titles, e.g:
+#   (Original Motion Picture Soundtrack)
+#   - From <Movie>
+#   (Remastered & Expanded Edition)
+def strip_title_junk(title):
+    junk = [' (Original', ' - From', ' (Remaster', ' [Remaster']
+    for j in junk:
+        index = title.find(j)
+        if index >= 0:
+            return title[:index]
+    return title
+
+
+def process_command(uri, index):
+    command = get_commands()[uri]
+    cmdname = command['label']
+    arturl = command['image']
+
+    # Determine the output image file name
+    qrout = 'out/{0}qr.png'.format(index)
+
+    # Create a QR code from the command URI
+    write_qr(uri, qrout)
+
+    # Command icons are shared by all cards using them
+    artimg = static_asset(arturl) or static_asset('ic_album_black_48dp.png')
+    return cmdname, None, None, artimg
+
+
+# Call a Spotify API function, waiting and retrying if we hit the rate limit (or a server
+# error) more often than spotipy's own retries can absorb
+def spotify_call(func, *args):
+    from spotipy import SpotifyException
+    delay = 1
+    for attempt in range(SPOTIFY_MAX_ATTEMPTS):
+        try:
+            result = func(*args)
+            # spotipy returns None once its own retries are used up
+            if result is not None:
+                return result
+            status, retry_after = 429, None
+        except SpotifyException as e:
+            if e.http_status != 429 and not 500 <= e.http_status < 600:
+                raise
+            status, retry_after = e.http_status, (e.headers or {}).get('Retry-After')
+        wait = int(retry_after) if retry_after else delay
+        logging.info('Spotify returned %d, retrying in %d seconds' % (status, wait))
+        time.sleep(wait)
+        delay *= 2
+    raise ValueError('Spotify request failed after %d attempts' % (SPOTIFY_MAX_ATTEMPTS))
+
+
+# Fetch the metadata of all Spotify tracks, albums and artists listed in `lines` with as few
+# batched requests as possible, and keep it in `spotify_cache` for the `process_spotify_*`
+# functions. Items missing from the cache are requested one by one as before, so an invalid
+# ID, which fails its whole batch, only fails its own card; if Spotify can't be reached at all,
+# each Spotify card fails on its own and goes to the error report.
+def prefetch_spotify(lines):
+    uris = {kind: [] for kind in SPOTIFY_BATCH_SIZES}
+    for line in lines:
+        line = line.strip()
+        for kind in SPOTIFY_BATCH_SIZES:
+            if line.startswith('spotify:' + kind + ':') and line not in spotify_cache and line not in uris[kind]:
+                uris[kind].append(line)
+    if not any(uris.values()):
+        return
+
+    try:
+        spotify = get_spotify()
+    except Exception as e:
+        logging.warning('Could not connect to Spotify, fetching the Spotify items one by one: %s' % (e))
+        return
+    for kind, batch_size in SPOTIFY_BATCH_SIZES.items():
+        kind_uris = uris[kind]
+        for start in range(0, len(kind_uris), batch_size):
+            batch = kind_uris[start:start + batch_size]
+            logging.info('Fetching %d Spotify %ss' % (len(batch), kind))
+            try:
+                # (spotipy's batch endpoints are `tracks`, `albums` and `artists`)
+                items = spotify_call(getattr(spotify, kind + 's'), batch)[kind + 's']
+            except Exception as e:
+                logging.warning('Could not fetch a batch of %d Spotify %ss, fetching them one by one: %s' % (
+                    len(batch), kind, e))
+                continue
+            for uri, item in zip(batch, items):
+                # (unknown ids come back as None)
+                if item:
+                    spotify_cache[uri] = item
+
+
+def process_spotify_track(uri, index):
+    track = spotify_cache.pop(uri, None) or get_spotify().track(uri)
+
+    logging.info(track)
+    logging.info('track    : %s' % (track['name']))
+
+    # strip title junk
+    song = strip_title_junk(track['name'])
+    artist = strip_title_junk(track['artists'][0]['name'])
+    album = strip_title_junk(track['album']['name'])
+    arturl = track['album']['images'][0]['url']
+
+    # Determine the output image file names
+    qrout = 'out/{0}qr.png'.format(index)
+    artimg = card_art_filename(index)
+    artout = 'out/' + artimg
+
+    # Create a QR code from the track URI
+    write_qr(card_code(uri), qrout)
+
+    # Fetch the artwork and save to the output directory
+    fetch_artwork(arturl, artout)
+
+    return song, album, artist, artimg
+
+
+def process_spotify_album(uri, index):
+    album = spotify_cache.pop(uri, None) or get_spotify().album(uri)
+
+    logging.info(album['name'])
+
+    # strip title junk
+    album_name = strip_title_junk(album['name'])
+    artist_name = strip_title_junk(album['artists'][0]['name'])
+    arturl = album['images'][0]['url']
+
+    # Determine the output image file names
+    qrout = 'out/{0}qr.png'.format(index)
+    artimg = card_art_filename(index)
+    artout = 'out/' + artimg
+
+    # Create a QR code from the album URI
+    write_qr(card_code(uri), qrout)
+
+    # Fetch the artwork and save to the output directory
+    fetch_artwork(arturl, artout)
+
+    album_blank = ''
+    return album_name, album_blank, artist_name, artimg
+
+
+# Artist cards play the artist's top tracks. They are looked up here and stored in the
+# catalog (and published to the catalog service), so that qrplay can queue them as soon as
+# the card is scanned, without asking Spotify.
+def process_spotify_artist(uri, index):
+    spotify = get_spotify()
+    artist = spotify_cache.pop(uri, None) or spotify.artist(uri)
+    market = defaults.get('spotify_market') or catalog.DEFAULT_MARKET
+    top_tracks = spotify_call(spotify.artist_top_tracks, uri, market)['tracks']
+    track_uris = [track['uri'] for track in top_tracks]
+
+    logging.info('%s: %d top tracks' % (artist['name'], len(track_uris)))
+
+    catalog.set_artist_tracks(get_catalog(), uri, track_uris)
+    published_codes[uri] = catalog.pack_track_uris(track_uris)
+
+    # strip title junk
+    artist_name = strip_title_junk(artist['name'])
+
+    # Determine the output image file names
+    qrout = 'out/{0}qr.png'.format(index)
+    artimg = card_art_filename(index)
+    artout = 'out/' + artimg
+
+    # Create a QR code from the artist URI
+    write_qr(card_code(uri), qrout)
+
+    # Fetch the artist picture and save to the output directory (not all artists have one)
+    if not artist['images'] or not fetch_artwork(artist['images'][0]['url'], artout):
+        logging.info('Got no artist picture, setting artwork to default.')
+        if os.path.exists(artout):
+            os.remove(artout)
+        artimg = static_asset('ic_album_black_48dp.png')
+
+    return artist_name, '', '', artimg
+
+
+def process_spotify_playlist(uri, index):
+    sp_user = uri.split(':')[2]
+    playlist = get_spotify().user_playlist(sp_user, uri)
+    playlist_name = playlist['name']
+
+    logging.info(playlist['name'])
+
+    # strip title junk
+    playlist_owner = strip_title_junk(playlist['owner']['id'])
+    arturl = playlist['images'][0]['url']
+
+    # Determine the output image file names
+    qrout = 'out/{0}qr.png'.format(index)
+    artimg = card_art_filename(index)
+    artout = 'out/' + artimg
+
+    # Create a QR code from the playlist URI
+    write_qr(card_code(uri), qrout)
+
+    # Fetch the artwork and save to the output directory
+    fetch_artwork(arturl, artout)
+
+    playlist_blank = ''
+    return playlist_name, playlist_owner, playlist_blank, artimg
+
+
+def process_library_playlist(uri, index):
+    # library playlist looks like:
+    #   pl:file:///jffs/settings/savedqueues.rsq#0$Ray Charles et. al.
+    # card needs: playlist title, uri
+
+    xlist = uri.split('$')
+    x_uri = xlist[0]
+    x_title = xlist[1]
+    song = ''
+    artist = ''
+    album = strip_title_junk(x_title)
+
+    # Determine the output image file name
+    qrout = 'out/{0}qr.png'.format(index)
+
+    # Create a QR code from the playlist URI
+    write_qr(card_code(x_uri), qrout)
+
+    # Use the default playlist art
+    artimg = static_asset('ic_playlist_play_black_48dp.png')
+
+    return song, album, artist, artimg
+
+
+def process_library_album(uri, index):
+    # library album looks like:
+    #   alb:A:ALBUM/Wolfgang%20Amadeus%20Phoenix$Phoenix$Wolfgang Amadeus Phoenix$/getaa?u=x-file-cifs%3a%2f%2fcomputer%2fmusic%2fiTunes%2fMusic%2fPhoenix%2fWolfgang%2520Amadeus%2520Phoenix%2f01%2520Lisztomania.mp3&v=158
+    # library album to be hashed looks like:
+    #   alb:hsh:A:ALBUM/Wolfgang%20Amadeus%20Phoenix$Phoenix$Wolfgang Amadeus Phoenix$/getaa?u=x-file-cifs%3a%2f%2fcomputer%2fmusic%2fiTunes%2fMusic%2fPhoenix%2fWolfgang%2520Amadeus%2520Phoenix%2f01%2520Lisztomania.mp3&v=158
+    # card needs: uri, album title, album artist, album art
+    xlist = uri.split('$')
+    x_uri = xlist[0]
+    x_artist = xlist[1]
+    x_title = xlist[2]
+    x_art_url = xlist[3]
+
+    song = ''
+    artist = strip_title_junk(x_artist)
+    album = strip_title_junk(x_title)
+    # build full album art URI from the art path and the speaker address
+    arturl = build_album_art_full_uri(get_speaker().ip_address, x_art_url)
+
+    # Fix any missing 'The' prefix
+    # Sonos strips the "The" prefix for bands that start with "The"
+    # (it appears to do this only in listing contexts; when querying the
+    # current/next queue track it still includes the "The").
+    # As a dumb hack (to preserve the "The") we can look at the raw URI
+    # for the track artwork (this assumes an iTunes-style directory structure),
+    # parse out the artist directory name and see if it starts with "The".
+    uri_path = unquote(x_art_url)
+    lib_part = uri_path.split('/iTunes/Music/', 1)[-1]
+    artist_part = lib_part.split('/', 1)[0]
+    if artist_part.startswith('The%20'):
+        artist = 'The ' + artist
+
+    # Determine the output image file names
+    qrout = 'out/{0}qr.png'.format(index)
+    artimg = card_art_filename(index)
+    artout = 'out/' + artimg
+
+    if args.short_ids:
+        # Create a short ID for the album, whether or not it was marked for hashing
+        album_id = x_uri[8:] if x_uri.startswith('alb:hsh:') else x_uri[4:]
+        qrcode = card_code('alb:' + album_id)
+    elif 'hsh:' in x_uri:
+        # Create a hash string for simpler QR code
+        URItohash = x_uri[8:]
+        hash_object = hashlib.md5(URItohash.encode())
+        albhash = 'alb:hsh:' + hash_object.hexdigest()
+        # Write hash and track uri to pickle so qrplay can retrieve it later
+        d = {}
+        if os.path.exists(hashed_albums):
+            with open(hashed_albums, 'rb') as r:
+                d = pickle.load(r)
+        if albhash not in d:
+            d[albhash] = URItohash
+        published_codes[albhash] = URItohash
+        with open(hashed_albums, 'wb') as w:
+            pickle.dump(d, w)
+        # Create a QR code from the hashed album URI
+        qrcode = albhash
+    else:
+        # Create a QR code from the album URI
+        qrcode = x_uri
+
+    # Write the QR code to disk
+    write_qr(qrcode, qrout)
+
+    # Fetch the artwork and save to the output directory.
+    # Some itunes artwork is too large to display in sonos, and in those cases,
+    # this fetch will fail partway through. The part received is kept, and decoded
+    # as far as it goes when the artwork is normalized.
+    if not fetch_artwork(arturl, artout):
+        logging.info('Got no album art, setting album art to default.')
+        os.remove(artout)
+        artimg = static_asset('ic_album_black_48dp.png')
+
+    return song, album, artist, artimg
+
+
+def process_library_track(uri, index):
+    # library track looks like:
+    #   trk:x-file-cifs://computer/music/iTunes/Music/Original%20Soundtrack/Chants%20From%20The%20Thin%20Red%20Line/01%20Jisas%20Yu%20Hand%20Blong%20Mi.mp3$Choir of All Saints$Jisas Yu Hand Blong Mi$Chants From The Thin Red Line$/getaa?u=x-file-cifs%3a%2f%2fcomputer%2fmusic%2fiTunes%2fMusic%2fOriginal%2520Soundtrack%2fChants%2520From%2520The%2520Thin%2520Red%2520Line%2f01%2520Jisas%2520Yu%2520Hand%2520Blong%2520Mi.mp3&v=158
+    # card needs: uri, track title, track artist, album title, album art
+
+    xlist = uri.split('$')
+    fullURI = xlist[0]
+    xURI = fullURI[4:]
+    xArtist = xlist[1]
+    xTitle = xlist[2]
+    xAlbum = xlist[3]
+    xArtUrl = xlist[4]
+
+    song = strip_title_junk(xTitle)
+    artist = strip_title_junk(xArtist)
+    album = strip_title_junk(xAlbum)
+    # build full album art URI from the art path and the speaker address
+    arturl = build_album_art_full_uri(get_speaker().ip_address, xArtUrl)
+
+    # Fix any missing 'The' prefix
+    # Sonos strips the "The" prefix for bands that start with "The"
+    # (it appears to do this only in listing contexts; when querying the
+    # current/next queue track it still includes the "The").
+    # As a dumb hack (to preserve the "The") we can look at the raw URI
+    # for the track artwork (this assumes an iTunes-style directory structure),
+    # parse out the artist directory name and see if it starts with "The".
+    uri_path = unquote(xArtUrl)
+    lib_part = uri_path.split('/iTunes/Music/', 1)[-1]
+    artist_part = lib_part.split('/', 1)[0]
+    if artist_part.startswith('The%20'):
+        artist = 'The ' + artist
+
+    # Determine the output image file names
+    qrout = 'out/{0}qr.png'.format(index)
+    artimg = card_art_filename(index)
+    artout = 'out/' + artimg
+
+    if args.short_ids:
+        # Create a short ID for the track URI
+        trkhash = card_code('trk:' + xURI)
+    else:
+        # Create a hash string for simpler QR code
+        hash_object = hashlib.md5(xURI.encode())
+        trkhash = 'trk:' + hash_object.hexdigest()
+        # Write hash and track uri to pickle so qrplay can retrieve it later
+        d = {}
+        if os.path.exists(hashed_tracks):
+            with open(hashed_tracks, 'rb') as r:
+                d = pickle.load(r)
+        if trkhash not in d:
+            d[trkhash] = xURI
+        published_codes[trkhash] = xURI
+        with open(hashed_tracks, 'wb') as w:
+            pickle.dump(d, w)
+
+    # Create a QR code from the track URI
+    write_qr(trkhash, qrout)
+
+    # Fetch the artwork and save to the output directory
+    if not fetch_artwork(arturl, artout):
+        logging.info('Got no track art, setting track art to default.')
+        os.remove(artout)
+        artimg = static_asset('ic_album_black_48dp.png')
+
+    return song, album, artist, artimg
+
+
+# Writes a sheet of cards to out/ as the cards are generated, rather than building the
+# whole page in memory. If `cards_per_page` is set, the cards are split across several
+# files (e.g. index-001.html, index-002.html, ...) and `filename` becomes a small index
+# page linking to each of them.
+class CardSheet:
+    def __init__(self, filename, cards_per_page=None):
+        self.filename = filename
+        self.cards_per_page = cards_per_page
+        self.page = None
+        self.page_cards = 0
+        # [filename, number of cards] of each page written so far
+        self.pages = []
+
+    def new_page(self):
+        self.close_page()
+        if self.cards_per_page:
+            base, ext = os.path.splitext(self.filename)
+            page_filename = '{0}-{1:03d}{2}'.format(base, len(self.pages) + 1, ext)
+        else:
+            page_filename = self.filename
+        self.pages.append([page_filename, 0])
+        self.page_cards = 0
+        self.page = open(os.path.join('out', page_filename), 'w')
+        self.page.write(HTML_HEADER)
+
+    def close_page(self):
+        if self.page:
+            self.page.write(HTML_FOOTER)
+            self.page.close()
+            self.page = None
+
+    # Append the HTML content of one card (as returned by `card_content_html`)
+    def add_card(self, content):
+        if self.page is None or self.page_cards == self.cards_per_page:
+            self.new_page()
+        self.page.write('<div class="card">\n')
+        self.page.write(content)
+        self.page.write('</div>\n')
+        if self.page_cards % 2 == 1:
+            self.page.write('<br style="clear: both;"/>\n')
+        self.page_cards += 1
+        self.pages[-1][1] = self.page_cards
+        self.page.flush()
+
+    def close(self):
+        if not self.pages:
+            # Still write an (empty) sheet if there were no cards
+            self.new_page()
+        self.close_page()
+        if self.cards_per_page:
+            self.write_index()
+
+    # Write the index page linking to each page of cards
+    def write_index(self):
+        with open(os.path.join('out', self.filename), 'w') as f:
+            f.write(HTML_HEADER)
+            f.write('<ul>\n')
+            first = 1
+            for page_filename, count in self.pages:
+                f.write('  <li><a href="{0}">Cards {1} to {2}</a></li>\n'.format(page_filename, first,
+                                                                                first + count - 1))
+                first += count
+            f.write('</ul>\n')
+            f.write(HTML_FOOTER)
+
+
+# Report of the input lines that couldn't be turned into cards, written to `filename` in
+# out/ as they are found. The file is only created if there are any.
+class ErrorReport:
+    def __init__(self, filename):
+        self.path = os.path.join('out', filename)
+        self.file = None
+        self.writer = None
+        self.count = 0
+        # Don't leave the report of an earlier run around
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def add(self, number, line, error):
+        logging.warning('Skipping line %d (%s): %s' % (number, line, error))
+        if self.file is None:
+            self.file = open(self.path, 'w', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(['line', 'input', 'error'])
+        self.writer.writerow([number, line, error])
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+# Return the HTML content for a single card.
+def card_content_html(index, artist, album, song, artimg):
+    qrimg = '{0}qr.png'.format(index)
+
+    html = ''
+    html += '  <img src="{0}" class="art"/>\n'.format(artimg)
+    html += '  <img src="{0}" class="qrcode"/>\n'.format(qrimg)
+    html += '  <div class="labels">\n'
+    if song:
+        html += '    <p class="song">{0}</p>\n'.format(song)
+    else:
+        html += '    <p class="song">{0}</p>\n'.format(album)
+    if artist:
+        html += '    <p class="artist"><span class="small">par</span> {0}</p>\n'.format(artist)
+    if album and song:
+        html += '    <p class="album"><span class="small">de</span> {0}</p>\n'.format(album)
+    html += '  </div>\n'
+    return html
+
+
+# Return the job for rendering a PNG version of an individual card (with no dashed lines)
+# to out/{index}card.png. The jobs are rendered together by `cardimage.render_cards`.
+def individual_card_image_job(index, artist, album, song, artimg):
+    return ('out/{0}card.png'.format(index), 'out/' + artimg, 'out/{0}qr.png'.format(index), song, artist, album)
+
+
+# Yield the card input lines: the lines of the input file, read as they are needed, or the
+# command cards
+def read_card_lines():
+    if args.input:
+        with open(args.input) as f:
+            yield from f
+    elif args.commands:
+        for command in get_commands().values():
+            yield command['command']
+
+
+# Create the QR code and artwork of the card for input line `line`, and return the card's
+# (song, album, artist, artwork filename). Raises ValueError for lines that aren't cards.
+def process_line(line, index):
+    if line.startswith('cmd:'):
+        return process_command(line, index)
+    elif line.startswith('mode:'):
+        return process_command(line, index)
+    elif line.startswith('spotify:album:'):
+        return process_spotify_album(line, index)
+    elif line.startswith('spotify:track:'):
+        return process_spotify_track(line, index)
+    elif line.startswith('spotify:artist:'):
+        return process_spotify_artist(line, index)
+    elif line.startswith('spotify:user:') and ':playlist:' in line:
+        return process_spotify_playlist(line, index)
+    elif line.startswith('trk:'):
+        return process_library_track(line, index)
+    elif line.startswith('alb:'):
+        return process_library_album(line, index)
+    elif line.startswith('pl:'):
+        return process_library_playlist(line, index)
+    raise ValueError('Failed to handle URI')
+
+
+# Finish a batch of cards generated by `generate_cards`: verify their QR codes (`codes`),
+# publish their hashed and short-ID codes (`published`), normalize their artwork, and then
+# append the cards (index, artist, album, song, artwork filename) to `sheet` and render their
+# individual card images, on the worker processes of `pool`. Cards whose artwork can't be
+# decoded use `fallback_art` instead.
+def finish_cards(sheet, fallback_art, codes, published, cards, first_batch, pool):
+    from . import artwork, cardimage
+
+    # Check that the codes decode well before they are used in card images
+    if args.verify:
+        verify_qr_codes(codes, append=not first_batch, pool=pool)
+
+    # Make the codes of hashed and short-ID cards available to qrplay devices
+    if args.catalog_url and published:
+        publish_codes(published)
+
+    # Downscale the artwork fetched for the cards to the size needed by the card layout
+    # (static assets are used as is)
+    art_files = ['out/' + artimg for index, _, _, _, artimg in cards if artimg == card_art_filename(index)]
+    failed = set(artwork.normalize_all(art_files, workers=args.image_workers, pool=pool))
+    if failed:
+        logging.info('Setting art to default for %d cards' % (len(failed)))
+        cards = [card[:4] + (fallback_art,) if 'out/' + card[4] in failed else card for card in cards]
+
+    # Append the HTML for the cards
+    for card in cards:
+        sheet.add_card(card_content_html(*card))
+
+    if args.generate_images or args.zones:
+        # Also generate an individual PNG for each card
+        image_jobs = [individual_card_image_job(*card) for card in cards]
+        logging.info('Rendering %d card images' % (len(image_jobs)))
+        cardimage.render_cards(image_jobs, workers=args.image_workers, pool=pool)
+
+
+def generate_cards():
+    # Create the output directory
+    dirname = os.getcwd()
+    outdir = os.path.join(dirname, 'out')
+    if not os.path.exists(outdir):
+        os.mkdir(outdir)
+
+    # The index of the current item being processed
+    index = 0
+
+    # Copy the CSS file into the output directory.  (Note the use of 'page-break-inside: avoid'
+    # in `cards.css`; this prevents the card divs from being spread across multiple pages
+    # when printed.)
+    shutil.copyfile('cards.css', 'out/cards.css')
+
+    # Cards are written out batch by batch, as they are finished
+    if args.commands:
+        sheet = CardSheet('commands.html', args.cards_per_page)
+    else:
+        sheet = CardSheet('index.html', args.cards_per_page)
+
+    # Lines that can't be turned into cards are reported, and the other cards still generated
+    errors = ErrorReport('errors.csv')
+
+    # Batches of cards are finished on a separate thread while the next batch is generated.
+    # At most one batch waits in the queue, so generating cards blocks when finishing them
+    # falls behind.
+    batches = queue.Queue(maxsize=1)
+    finish_failures = []
+
+    # All batches are finished on one pool of worker processes, started before the thread
+    pool = parallel.make_pool(args.image_workers)
+
+    # Artwork for the cards whose own artwork can't be decoded (stored up front, as static
+    # assets are only stored from this thread)
+    fallback_art = static_asset('ic_album_black_48dp.png')
+
+    def finish_batches():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            # (after a failure, only keep the queue moving so that generating cards doesn't block)
+            if not finish_failures:
+                try:
+                    finish_cards(sheet, fallback_art, *batch, pool)
+                except BaseException as e:
+                    finish_failures.append(e)
+
+    finisher = threading.Thread(target=finish_batches, name='finish-cards')
+    finisher.start()
+
+    numbered_lines = enumerate(read_card_lines(), 1)
+    first_batch = True
+    try:
+        while not finish_failures:
+            batch = [(number, line.strip()) for number, line in itertools.islice(numbered_lines, CARD_BATCH_SIZE)]
+            if not batch:
+                break
+
+            # Fetch the Spotify metadata for the batch up front, in batches
+            prefetch_spotify([line for _, line in batch])
+
+            # The cards of the batch, written out once their artwork is normalized
+            cards = []
+
+            for number, line in batch:
+                if not line:
+                    continue
+                try:
+                    (song, album, artist, artimg) = process_line(line, index)
+                except Exception as e:
+                    errors.add(number, line, str(e) or type(e).__name__)
+                    # the next card reuses this index, and overwrites what was written for this one
+                    qr_codes.pop('out/{0}qr.png'.format(index), None)
+                    continue
+
+                cards.append((index, artist, album, song, artimg))
+                index += 1
+
+            # Hand the batch over to be finished, with the codes written for it
+            batches.put((dict(qr_codes), dict(published_codes), cards, first_batch))
+            qr_codes.clear()
+            published_codes.clear()
+            spotify_cache.clear()
+            first_batch = False
+    finally:
+        batches.put(None)
+        finisher.join()
+        sheet.close()
+        errors.close()
+        if pool:
+            pool.shutdown()
+
+    if finish_failures:
+        raise finish_failures[0]
+    if errors.count:
+        logging.warning('Skipped %d input lines, see out/errors.csv' % (errors.count))
+        exit(1)
+
+
+def main(argv=None):
+    logging.basicConfig(  # filename = 'qrgen.log',
+        # filemode = 'w',
+        level=logging.INFO,
+        format=LOG_FORMAT)
+    parse_args(argv)
+
+    profiler = None
+    if args.profile:
+        profiler = profiling.Profiler(args.profile)
+        profiler.instrument(globals(), ('process_',))
+        profiler.enable()
+
+    try:
+        if args.input:
+            generate_cards()
+        elif args.list_library_albums:
+            list_library_albums()
+        elif args.list_library_playlists:
+            list_library_playlists()
+        elif args.list_library_tracks:
+            list_library_tracks()
+        elif args.sync_library:
+            sync_library()
+        elif args.catalog_import:
+            import_catalog()
+        elif args.search:
+            search_catalog()
+        elif args.publish_catalog:
+            publish_catalog()
+        elif args.serve_catalog:
+            serve_catalog()
+        elif args.zones:
+            get_zones()
+        elif args.commands:
+            generate_cards()
+        elif args.set_defaults:
+            set_defaults()
+    finally:
+        if profiler:
+            profiler.report()
+
+
+if __name__ == '__main__':
+    main()
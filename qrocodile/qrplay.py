@@ -0,0 +1,670 @@
+import logging
+import argparse
+import json
+import os
+import pickle
+import signal
+import subprocess
+import sys
+import threading
+import time
+from time import sleep
+
+from . import catalog, catalogservice, profiling
+from .library import browse_page
+
+# soco, spotipy and RPi.GPIO are imported when they are first needed: the GPIO LED is only
+# set up when running the scanner, and Spotify access only when a Spotify card is scanned.
+
+LOG_FORMAT = '%(levelname)s %(asctime)s - %(message)s'
+logger = logging.getLogger()
+
+# check python version
+if sys.version_info[0] < 3:
+    raise Exception("Python 3 or a more recent version is required.")
+
+# Defaults loaded from my_defaults.txt, and the parsed command line arguments (set by `main()`)
+defaults = {}
+args = None
+# player uuid for use in building album URIs
+album_prefix = None
+
+# set filename for pickle of hashed library items
+hashed_tracks = 'hashed_tracks.dat'
+hashed_albums = 'hashed_albums.dat'
+
+# RPi.GPIO, imported by `setup_led()`
+GPIO = None
+
+# The Spotify client, set up on first use by `get_spotify()`
+sp = None
+# Spotify access requested for qrplay
+SPOTIFY_SCOPE = 'user-library-read'
+
+# soco instance for accessing sonos speaker (set by `main()`)
+spkr = None
+
+# The QR code scanner process
+p = None
+
+# Keep track of the last-seen code
+last_qrcode = ''
+
+# Catalog used to resolve short-ID and artist cards, opened on first use by `get_catalog()`
+catalog_conn = None
+
+# Local replica of the catalog service, if one is configured (set by `main()`)
+catalog_replica = None
+
+# Age after which the stored top tracks of an artist card are looked up again on Spotify,
+# and how often the background refresh checks for them, in seconds
+ARTIST_REFRESH_SECONDS = 24 * 60 * 60
+ARTIST_REFRESH_CHECK_SECONDS = 60 * 60
+
+# What was last queued on each speaker, by speaker IP address: (card code, UpdateID of the
+# speaker's queue once the card was queued)
+queue_mirror = {}
+
+class Mode:
+    PLAY_SONG_IMMEDIATELY = 1
+    PLAY_ALBUM_IMMEDIATELY = 2
+    BUILD_QUEUE = 3
+
+current_mode = Mode.PLAY_ALBUM_IMMEDIATELY
+
+def switch_to_room(room):
+    global spkr
+    import soco
+
+    if spkr.player_name != room:
+        spkr = soco.discovery.by_name(room)
+    current_device = spkr.player_name
+    with open(".last-device", "w") as device_file:
+        device_file.write(current_device)
+
+# Set up GPIO for the wired LED
+def setup_led():
+    global GPIO
+    import RPi.GPIO as GPIO
+    GPIO.setmode(GPIO.BOARD)
+    GPIO.setup(7, GPIO.OUT)
+    # make sure it's turned on
+    GPIO.output(7,True)
+
+# Causes the onboard green LED to blink on and off twice.  (This assumes Raspberry Pi 3 Model B; your
+# mileage may vary.)
+def blink_led():
+    duration = 0.15
+
+    def led_off():
+        subprocess.call("echo 0 > /sys/class/leds/led0/brightness", shell=True)
+        GPIO.output(7,False)
+
+    def led_on():
+        subprocess.call("echo 1 > /sys/class/leds/led0/brightness", shell=True)
+        GPIO.output(7,True)
+
+    # Technically we only need to do this once when the script launches
+    subprocess.call("echo none > /sys/class/leds/led0/trigger", shell=True)
+
+    led_on()
+    sleep(duration)
+    led_off()
+    sleep(duration)
+    led_on()
+    sleep(duration)
+    led_off()
+
+    # we need the GPIO LED to stay on because it illuminates the cards for the camera
+    GPIO.output(7,True)
+
+def handle_command(qrcode):
+    global current_mode
+    global spkr
+
+    logger.info('HANDLING COMMAND: ' + qrcode)
+
+    if qrcode == 'cmd:turntable':
+        spkr.switch_to_line_in(source=args.linein_source)
+        spkr.play()
+    elif qrcode.startswith('changezone:'):
+        newroom = qrcode.split(":")[1]
+        logger.info('Switching to '+ newroom)
+        switch_to_room(newroom)
+    elif qrcode.startswith('cmd:'):
+        action = qrcode.split(":")[1]
+        if action == 'play':
+            spkr.play()
+        elif action == 'pause':
+            spkr.pause()
+        elif action == 'next':
+            spkr.next()
+        elif action == 'prev':
+            spkr.previous()
+        elif action == 'stop':
+            spkr.stop()
+        elif action == 'shuffle/on':
+            spkr.play_mode = 'SHUFFLE_NOREPEAT'
+        elif action == 'shuffle/off':
+            spkr.play_mode = 'NORMAL'
+    elif qrcode == 'mode:songonly':
+        current_mode = Mode.PLAY_SONG_IMMEDIATELY
+    elif qrcode == 'mode:wholealbum':
+        current_mode = Mode.PLAY_ALBUM_IMMEDIATELY
+    elif qrcode == 'mode:buildqueue':
+        current_mode = Mode.BUILD_QUEUE
+        spkr.pause()
+        spkr.clear_queue()
+    else:
+        logger.info('No recognized command in handle_command.')
+
+
+# Return the UpdateID of the speaker's queue, which changes whenever the queue is modified
+def queue_update_id():
+    response = browse_page(spkr.contentDirectory, 'Q:0', 0, 1)
+    return response['UpdateID'] if response is not None else None
+
+# If the speaker's queue still holds what was queued for card `uri` (i.e. the queue hasn't
+# changed since), play it from the start, and return True; otherwise return False
+def resume_queue(uri):
+    mirrored = queue_mirror.get(spkr.ip_address)
+    if mirrored is None or mirrored[0] != uri or queue_update_id() != mirrored[1]:
+        return False
+    logger.info('Queue already holds ' + uri + ', playing it from the start')
+    spkr.play_from_queue(0)
+    return True
+
+def handle_library_item(uri):
+    global spkr
+    global album_prefix
+
+    logger.info('PLAYING FROM LIBRARY: ' + uri)
+
+    # Rescanning the card that built the current queue only needs to restart the queue
+    if resume_queue(uri):
+        return
+    # TODO: re-implement queue-building as in chrispcampbell original
+    ############
+    #
+    # Playing albums
+    #
+    #############
+
+    # to playback, construct a dummy DidlMusicAlbum to send to sonos queue
+    # needed to play album: URI, and album_id
+    # all albums share URI, which is:
+    # x-rincon-playlist:RINCON_[uuid of sonos zone]
+    # album_id can be got from QR code. It looks like:
+    # alb:A:ALBUM/Bone%20Machine
+    # albums can also be hashed. they look like:
+    # alb:hsh:[hashed_id]
+
+    if 'alb:' in uri:
+        # if this is a 'hashed' album, get album id from hashed resource
+        if 'hsh:' in uri:
+            album_id = resolve_hashed(uri, hashed_albums)
+            if album_id is None:
+                print('Hashed album not found: ' + uri)
+                return
+        else:
+            album_id = uri[4:]
+        album_fullURI = album_prefix + '#' + album_id
+        logging.info('sending full uri %s' % (album_fullURI))
+
+        # SoCo needs a DidlResource object to play albums
+        # We can construct a 'dummy' DidlResource with generic metadata,
+        # and when this is passed to the speaker, SoCo/Sonos will be able to fetch
+        # the album from the music library.
+        from soco.data_structures import DidlMusicAlbum, DidlResource
+        res = [DidlResource(uri=album_fullURI, protocol_info='dummy')]
+        didl = DidlMusicAlbum(title='dummy',parent_id='dummy',item_id=album_id,resources=res)
+        spkr.clear_queue()
+        spkr.add_to_queue(didl)
+        spkr.play()
+
+    ########
+    #
+    # Playing playlists or tracks
+    #
+    #########
+
+    # to playback, you need only the URI of the playlist/track,
+    # which comes in one of two forms.
+    # Sonos playlist looks like:
+    # file:///jffs/settings/savedqueues.rsq#0
+    # Imported itunes playlist looks like:
+    # x-file-cifs://computer/music/iTunes/iTunes%20Music%20Library.xml#9D1D3FDCFDBB6751
+    # Track looks like:
+    # x-file-cifs://computer/music/iTunes/Music/Original%20Soundtrack/Chants%20From%20The%20Thin%20Red%20Line/01%20Jisas%20Yu%20Hand%20Blong%20Mi.mp3
+
+    elif 'pl:' in uri:
+        pluri = uri[3:]
+        spkr.clear_queue()
+        spkr.add_uri_to_queue(uri=pluri)
+        spkr.play()
+    elif 'trk:' in uri:
+        if '://' in uri:
+            # plain track URI, as resolved from a short-ID card
+            trkuri = uri[4:]
+        else:
+            # look up hashuri in hashed tracks
+            trkuri = resolve_hashed(uri, hashed_tracks)
+            if trkuri is None:
+                print('Hashed track not found: ' + uri)
+                return
+        spkr.clear_queue()
+        spkr.add_uri_to_queue(uri=trkuri)
+        spkr.play()
+
+    # Remember what the queue now holds, so a rescan of the card can resume it
+    update_id = queue_update_id()
+    if update_id is not None:
+        queue_mirror[spkr.ip_address] = (uri, update_id)
+
+
+# Return a new Spotify client, asking the user to log in on the terminal if no token is cached
+def connect_spotify():
+    if not args.spotify_username:
+        logger.info('Not using a Spotify account')
+        raise ValueError('Must configure Spotify API access first using `--spotify-username`')
+    import spotipy
+    import spotipy.util as util
+    token = util.prompt_for_user_token(args.spotify_username,SPOTIFY_SCOPE,client_id=defaults['SPOTIPY_CLIENT_ID'],client_secret=defaults['SPOTIPY_CLIENT_SECRET'],redirect_uri=defaults['SPOTIPY_REDIRECT_URI'])
+    if not token:
+        logger.info('Can\'t get Spotify token for ' + args.spotify_username)
+        raise ValueError('Can\'t get Spotify token for ' + args.spotify_username)
+    logger.info("logged into Spotify")
+    return spotipy.Spotify(auth=token)
+
+# Return a Spotify client using the token cached by an earlier login (in the file
+# `prompt_for_user_token` keeps it in), or None if there is no cached token. Unlike
+# `connect_spotify`, this never waits for the user to log in on the terminal.
+def cached_spotify():
+    import spotipy
+    from spotipy import oauth2
+    sp_oauth = oauth2.SpotifyOAuth(defaults['SPOTIPY_CLIENT_ID'], defaults['SPOTIPY_CLIENT_SECRET'],
+                                   defaults['SPOTIPY_REDIRECT_URI'], scope=SPOTIFY_SCOPE,
+                                   cache_path='.cache-' + args.spotify_username)
+    token_info = sp_oauth.get_cached_token()
+    if not token_info:
+        return None
+    return spotipy.Spotify(auth=token_info['access_token'])
+
+# Return the Spotify client, setting up Spotify access on first use
+# UNUSED until SoCo restores support for spotify
+def get_spotify():
+    global sp
+    if sp is None:
+        sp = connect_spotify()
+    return sp
+
+# UNUSED until SoCo restores support for spotify
+def handle_spotify_item(uri):
+    logger.info('PLAYING FROM SPOTIFY: ' + uri)
+
+    if current_mode == Mode.BUILD_QUEUE:
+        action = 'queue'
+    elif current_mode == Mode.PLAY_ALBUM_IMMEDIATELY:
+        action = 'clearqueueandplayalbum'
+    else:
+        action = 'clearqueueandplaysong'
+
+    perform_room_request('spotify/{0}/{1}'.format(action, uri))
+
+# UNUSED until SoCo restores support for spotify
+def handle_spotify_album(uri):
+    logger.info('PLAYING ALBUM FROM SPOTIFY: ' + uri)
+
+    sp = get_spotify()
+    album_raw = sp.album(uri)
+    album_name = album_raw['name']
+    artist_name = album_raw['artists'][0]['name']
+
+    # create and update the track list
+    album_tracks_raw = sp.album_tracks(uri,limit=50,offset=0)
+    album_tracks = {}
+
+    # clear the sonos queue
+    action = 'clearqueue'
+    perform_room_request('{0}'.format(action))
+
+    # turn off shuffle before starting the new queue
+    action = 'shuffle/off'
+    perform_room_request('{0}'.format(action))
+
+    for tack in album_tracks_raw['items']:
+        track_number = track['track_number']
+        track_name = track['name']
+        track_uri = track['uri']
+        album_tracks.update({track_number: {}})
+        album_tracks[track_number].update({'uri': track_uri})
+        album_tracks[track_number].update({'name': track_name})
+        logger.info(track_number)
+        if track_number == int('1'):
+            # play track 1 immediately
+            action = 'now'
+            perform_room_request('spotify/{0}/{1}'.format(action, str(track_uri)))
+        else:
+            # add all remaining tracks to queue
+            action = 'queue'
+            perform_room_request('spotify/{0}/{1}'.format(action, str(track_uri)))
+
+# UNUSED until SoCo restores support for spotify
+def handle_spotify_playlist(uri):
+
+    logger.info('PLAYING PLAYLIST FROM SPOTIFY: ' + uri)
+    sp = get_spotify()
+    sp_user = uri.split(":")[2]
+    playlist_raw = sp.user_playlist(sp_user,uri)
+    playlist_name = playlist_raw["name"]
+
+    # clear the sonos queue
+    spkr.clear_queue()
+
+    # create and update the track list
+    playlist_tracks_raw = sp.user_playlist_tracks(sp_user,uri,limit=50,offset=0)
+    playlist_tracks = {}
+
+    # turn off shuffle before starting the new queue
+    spkr.play_mode = 'NORMAL'
+
+    # when not able to add a track to the queue, spotipy resets the track # to 1
+    # in this case I just handled the track nr separately with n
+    n = 0
+    for track in playlist_tracks_raw['items']:
+        n = n + 1
+        #track_number = track['track']['track_number'] # disabled as causing issues with non-playable tracks
+        track_number = n
+        track_name = track['track']["name"]
+        track_uri = track['track']["uri"]
+        playlist_tracks.update({track_number: {}})
+        playlist_tracks[track_number].update({"uri" : track_uri})
+        playlist_tracks[track_number].update({"name" : track_name})
+        logger.info(track_number)
+        if track_number == int("1"):
+            # play track 1 immediately
+            spkr.add_uri_to_queue(uri=track_uri)
+            spkr.play()
+        else:
+            # add all remaining tracks to queue
+            spkr.add_uri_to_queue(uri=track_uri)
+
+# Queue the top tracks of an artist. They were stored when qrgen generated the card (in
+# catalog.db or the catalog service), so no Spotify lookup is needed; the first track is
+# started right away, and the others are queued in one request.
+# UNUSED until SoCo restores support for spotify: like the playlist handler, this passes
+# plain `spotify:track:` URIs to the speaker, which Sonos doesn't play (it needs
+# `x-sonos-spotify:` URIs with the metadata of the household's Spotify account). The first
+# track is tried before the queue is cleared, so a speaker that rejects it keeps its queue.
+def handle_spotify_artist(uri):
+    from soco.exceptions import SoCoException
+    logger.info('PLAYING ARTIST TOP TRACKS FROM SPOTIFY: ' + uri)
+
+    track_uris = resolve_artist_tracks(uri)
+    if not track_uris:
+        print('No top tracks stored for artist: ' + uri)
+        return
+
+    try:
+        # check that the speaker takes the tracks before replacing the current queue
+        spkr.add_uri_to_queue(uri=track_uris[0])
+    except SoCoException as e:
+        logger.warning('Speaker did not accept the top tracks of %s, leaving the queue alone: %s' % (uri, e))
+        return
+
+    try:
+        # clear the sonos queue, and turn off shuffle before starting the new queue
+        spkr.clear_queue()
+        spkr.play_mode = 'NORMAL'
+
+        # play track 1 immediately
+        spkr.add_uri_to_queue(uri=track_uris[0])
+        spkr.play()
+
+        # add all remaining tracks to queue, as dummy tracks like the albums of handle_library_item
+        from soco.data_structures import DidlMusicTrack, DidlResource
+        tracks = [DidlMusicTrack(title='dummy', parent_id='dummy', item_id=track_uri,
+                                 resources=[DidlResource(uri=track_uri, protocol_info='dummy')])
+                  for track_uri in track_uris[1:]]
+        if tracks:
+            spkr.add_multiple_to_queue(tracks)
+    except SoCoException as e:
+        logger.warning('Could not play the top tracks of %s: %s' % (uri, e))
+
+# Return the catalog written by qrgen (catalog.db), opening it on first use, or None if it
+# wasn't copied to this device
+def get_catalog():
+    global catalog_conn
+    if catalog_conn is None and os.path.exists(catalog.CATALOG_FILE):
+        catalog_conn = catalog.open_catalog()
+    return catalog_conn
+
+# Look up the code a short-ID card stands for in the catalog (catalog.db, written by qrgen)
+def resolve_short_id(qrcode):
+    if get_catalog() is not None:
+        resolved = catalog.resolve_short_id(catalog_conn, qrcode)
+        if resolved is not None:
+            return resolved
+    return resolve_remote(qrcode)
+
+# Look up the stored top tracks of an artist in the catalog, or else through the catalog
+# service
+def resolve_artist_tracks(uri):
+    if get_catalog() is not None:
+        track_uris = catalog.artist_tracks(catalog_conn, uri)
+        if track_uris:
+            return track_uris
+    packed = resolve_remote(uri)
+    return catalog.unpack_track_uris(packed) if packed else None
+
+# Look up what a hashed card stands for in the hashed items file written by qrgen, if it
+# was copied to this device, or else through the catalog service
+def resolve_hashed(qrcode, hashed_file):
+    if os.path.exists(hashed_file):
+        with open(hashed_file, 'rb') as r:
+            b = pickle.loads(r.read())
+        if qrcode in b:
+            return b[qrcode]
+    return resolve_remote(qrcode)
+
+# Look up a card code in the local replica of the catalog service (which is synced with
+# the service if the code is missing and the service is reachable)
+def resolve_remote(qrcode):
+    if catalog_replica is None:
+        return None
+    return catalog_replica.resolve(qrcode)
+
+# Keep the top tracks of artist cards fresh, in a background thread: the replica of the
+# catalog service is synced, and if Spotify access is configured, top tracks stored in
+# catalog.db are looked up again once they are older than ARTIST_REFRESH_SECONDS.
+def refresh_artist_tracks():
+    # (SQLite connections can't be shared between threads)
+    conn = catalog.open_catalog() if os.path.exists(catalog.CATALOG_FILE) else None
+    market = defaults.get('spotify_market') or catalog.DEFAULT_MARKET
+    while True:
+        sleep(ARTIST_REFRESH_CHECK_SECONDS)
+        if catalog_replica is not None:
+            catalog_replica.sync()
+        if conn is None or not args.spotify_username:
+            continue
+        stale = catalog.stale_artists(conn, time.time() - ARTIST_REFRESH_SECONDS)
+        if not stale:
+            continue
+        try:
+            # (the refresh runs unattended, so it can't wait for an interactive login)
+            spotify = cached_spotify()
+            if spotify is None:
+                logger.warning('No cached Spotify token for %s, not refreshing artist top tracks '
+                               '(log in by scanning a Spotify card with qrplay in a terminal)' % (args.spotify_username))
+                continue
+            for artist_uri in stale:
+                top_tracks = spotify.artist_top_tracks(artist_uri, country=market)['tracks']
+                catalog.set_artist_tracks(conn, artist_uri, [track['uri'] for track in top_tracks])
+            logger.info('Refreshed the top tracks of %d artists' % (len(stale)))
+        except Exception as e:
+            # keep the tracks stored so far, and try again at the next check
+            logger.warning('Could not refresh artist top tracks: %s' % (e))
+
+
+def handle_qrcode(qrcode):
+    global last_qrcode
+    store_qr = True
+
+    # Short-ID cards are handled as the code they stand for
+    if qrcode.startswith(catalog.SHORT_ID_PREFIX):
+        resolved = resolve_short_id(qrcode)
+        if resolved is None:
+            print('Short ID not found in catalog: ' + qrcode)
+            return
+        logger.info('Resolved short ID %s to %s' % (qrcode, resolved))
+        qrcode = resolved
+
+    # Ignore redundant codes, except for commands like "whatsong", where you might
+    # want to perform it multiple times
+    if qrcode == last_qrcode and not qrcode.startswith('cmd:'):
+        print('IGNORING REDUNDANT QRCODE: ' + qrcode)
+        return
+
+    print('HANDLING QRCODE: ' + qrcode)
+
+    if qrcode.startswith('cmd:'):
+        handle_command(qrcode)
+    elif qrcode.startswith('mode:'):
+        handle_command(qrcode)
+    elif qrcode.startswith('spotify:album:'):
+        handle_spotify_album(qrcode)
+    elif qrcode.startswith('spotify:artist:'):
+        handle_spotify_artist(qrcode)
+    elif qrcode.startswith('spotify:user:'):
+        if (':playlist:') in qrcode:
+            handle_spotify_playlist(qrcode)
+    elif qrcode.startswith('spotify:'):
+        handle_spotify_item(qrcode)
+    elif qrcode.startswith('changezone:'):
+        handle_command(qrcode)
+    elif qrcode.startswith('pl:'):
+        handle_library_item(qrcode)
+    elif qrcode.startswith('trk:'):
+        handle_library_item(qrcode)
+    elif qrcode.startswith('alb:'):
+        handle_library_item(qrcode)
+    else:
+        # if qr code is not recognized, don't replace valid last_qrcode
+        print('QR code does not match known card patterns. Will not attempt play.')
+        store_qr = False
+
+    # Blink the onboard LED to give some visual indication that a code was handled
+    # (especially useful for cases where there's no other auditory feedback, like
+    # when adding songs to the queue)
+    if not args.debug_file:
+        blink_led()
+
+    if store_qr:
+        last_qrcode = qrcode
+
+
+# Monitor the output of the QR code scanner.
+def start_scan():
+    while True:
+        data = p.readline()
+        qrcode = str(data)[8:]
+        if qrcode:
+            qrcode = qrcode.rstrip()
+            handle_qrcode(qrcode)
+
+
+# Read from the `debug.txt` file and handle one code at a time.
+def read_debug_script():
+    # Read codes from `debug.txt`
+    with open(args.debug_file) as f:
+        debug_codes = f.readlines()
+
+    # Handle each code followed by a short delay
+    for code in debug_codes:
+        # Remove any trailing comments and newline (and ignore any empty or comment-only lines)
+        code = code.split("#")[0]
+        code = code.strip()
+        if code:
+            handle_qrcode(code)
+            sleep(4)
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(description='Translates QR codes detected by a camera into Sonos commands.')
+    arg_parser.add_argument('--default-device', default=defaults['default_room'], help='the name of your default device/room')
+    arg_parser.add_argument('--linein-source', default='Living Room', help='the name of the device/room used as the line-in source')
+    arg_parser.add_argument('--debug-file', help='read commands from a file instead of launching scanner')
+    arg_parser.add_argument('--spotify-username', default=defaults['default_spotify_user'], help='the username used to setup Spotify access(only needed if you want to use cards for Spotify tracks)')
+    arg_parser.add_argument('--catalog-url', default=defaults.get('catalog_url'), help='URL of the catalog service to resolve hashed and short-ID cards with, when they are not in the local files (defaults to `catalog_url` in my_defaults.txt)')
+    arg_parser.add_argument('--profile', nargs='?', const='qrplay.prof', metavar='FILE', help='time each card handled, and profile to FILE (qrplay.prof by default): for the whole run with --debug-file, otherwise between two SIGUSR1 signals (e.g. `pkill -USR1 -f qrplay`); print the hot spots when done')
+    return arg_parser
+
+def main(argv=None):
+    global defaults, album_prefix, args, spkr, p, catalog_replica
+
+    # Set up logfile
+    logging.basicConfig(#filename = 'qrplay.log',
+                        #filemode = 'w',
+                        level = logging.INFO,
+                        format = LOG_FORMAT)
+
+    # load defaults from my_defaults.txt
+    with open('my_defaults.txt','r') as f:
+        defaults = json.load(f)
+    album_prefix = defaults['album_uuid_prefix']
+    logger.info('Imported defaults: %s' % (defaults))
+
+    # Parse the command line arguments
+    args = build_arg_parser().parse_args(argv)
+
+    # Load the most recently used device, if available, otherwise fall back on the `default-device` argument
+    try:
+        with open('.last-device', 'r') as device_file:
+            current_device = device_file.read().replace('\n', '')
+            logger.info('Defaulting to last used room: ' + current_device)
+    except:
+        current_device = args.default_device
+        logger.info('Initial room: ' + current_device)
+
+    import soco
+    spkr = soco.discovery.by_name(current_device).group.coordinator
+
+    if args.catalog_url:
+        # Start from the local replica, brought up to date if the service is reachable
+        catalog_replica = catalogservice.CatalogReplica(args.catalog_url)
+        catalog_replica.sync()
+
+    if args.catalog_url or args.spotify_username:
+        threading.Thread(target=refresh_artist_tracks, name='artist-refresh', daemon=True).start()
+
+    profiler = None
+    if args.profile:
+        profiler = profiling.Profiler(args.profile)
+        profiler.instrument(globals(), ('handle_',))
+        if args.debug_file:
+            profiler.enable()
+        else:
+            # the scanner runs indefinitely: profile between two SIGUSR1 signals
+            signal.signal(signal.SIGUSR1, profiler.toggle)
+
+    try:
+        if args.debug_file:
+            # Run through a list of codes from a local file
+            read_debug_script()
+        else:
+            setup_led()
+            # Start the QR code reader
+            # --nodisplay required as running pi headless, to avoid invalid argument (22) errors
+            p = os.popen('/usr/bin/zbarcam --nodisplay --prescale=300x200', 'r')
+            try:
+                start_scan()
+            except KeyboardInterrupt:
+                print('Stopping scanner...')
+            finally:
+                GPIO.cleanup()
+                p.close()
+    finally:
+        if profiler:
+            profiler.report()
+
+if __name__ == '__main__':
+    main()
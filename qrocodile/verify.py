@@ -0,0 +1,103 @@
+# Checks that generated QR codes decode quickly in the conditions qrplay reads them in.
+#
+# qrplay scans cards with `zbarcam --prescale=300x200`: each camera frame is downscaled to
+# 300x200 before decoding, with the card filling about the height of the frame. Each code
+# is placed in such a frame, at the size the card layout prints it, then blurred and
+# covered in sensor noise, and decoded with zbar. This is repeated with fresh noise
+# `ATTEMPTS` times.
+#
+# zbar is used through pyzbar if it is installed (and finds the zbar library), or else
+# through the `zbarimg` command from zbar-tools. With `zbarimg`, decode times include
+# starting the command, so only decode failures are meaningful.
+import logging
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from PIL import Image, ImageChops, ImageFilter
+
+from . import cardimage, parallel
+
+# Size of the frames zbarcam decodes (its `--prescale` in qrplay)
+SCAN_SIZE = (300, 200)
+
+# Side of the QR code in a scanned frame, in pixels (the card fills the height of the frame)
+SCAN_QR_SIZE = round(cardimage.ART_SIZE * SCAN_SIZE[1] / cardimage.CARD_HEIGHT)
+
+# Simulated camera blur (Gaussian radius, in frame pixels) and sensor noise (standard
+# deviation, in grey levels)
+BLUR_RADIUS = 0.8
+NOISE_SIGMA = 24
+
+# Number of noisy frames decoded per code
+ATTEMPTS = 3
+
+# Median decode time above which a code is considered slow to lock on (pyzbar only)
+SLOW_DECODE_SECONDS = 0.01
+
+
+# Return the zbar interface available: 'pyzbar', 'zbarimg', or None
+def find_decoder():
+    try:
+        from pyzbar import pyzbar  # noqa: F401
+        return 'pyzbar'
+    except ImportError:
+        # (pyzbar also raises ImportError if it can't find the zbar library)
+        pass
+    if shutil.which('zbarimg'):
+        return 'zbarimg'
+    return None
+
+
+# Return a frame showing the QR code image `qr_file` as qrplay's scanner sees it
+def scan_frame(qr_file):
+    with Image.open(qr_file) as qr:
+        # as printed on the card (see `cardimage.render_card`), then seen by the camera
+        qr = qr.convert('L').resize((cardimage.px(cardimage.ART_SIZE), cardimage.px(cardimage.ART_SIZE)),
+                                    Image.NEAREST)
+        qr = qr.resize((SCAN_QR_SIZE, SCAN_QR_SIZE), Image.BILINEAR)
+    frame = Image.new('L', SCAN_SIZE, 255)
+    frame.paste(qr, ((SCAN_SIZE[0] - SCAN_QR_SIZE) // 2, (SCAN_SIZE[1] - SCAN_QR_SIZE) // 2))
+    frame = frame.filter(ImageFilter.GaussianBlur(BLUR_RADIUS))
+    # effect_noise is centered on grey level 128
+    return ImageChops.add(frame, Image.effect_noise(SCAN_SIZE, NOISE_SIGMA), 1.0, -128)
+
+
+# Return the texts of the QR codes zbar finds in `frame`
+def decode(frame, decoder):
+    if decoder == 'pyzbar':
+        from pyzbar import pyzbar
+        return [symbol.data.decode('utf-8') for symbol in pyzbar.decode(frame, symbols=[pyzbar.ZBarSymbol.QRCODE])]
+    with tempfile.NamedTemporaryFile(suffix='.png') as f:
+        frame.save(f, 'PNG')
+        f.flush()
+        result = subprocess.run(['zbarimg', '--quiet', '--raw', '-Sdisable', '-Sqrcode.enable', f.name],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return result.stdout.decode('utf-8').splitlines()
+
+
+# Decode one QR code `ATTEMPTS` times. `job` is a tuple of (QR code file, expected
+# content, decoder). Returns (QR code file, number of correct decodes, median decode
+# time in seconds).
+def verify_code(job):
+    (qr_file, content, decoder) = job
+    decoded = 0
+    times = []
+    for _ in range(ATTEMPTS):
+        frame = scan_frame(qr_file)
+        start = time.perf_counter()
+        texts = decode(frame, decoder)
+        times.append(time.perf_counter() - start)
+        if content in texts:
+            decoded += 1
+    return qr_file, decoded, statistics.median(times)
+
+
+# Verify QR codes on a pool of worker processes (`pool`, or one process per core by default)
+def verify_all(jobs, workers=None, pool=None):
+    jobs = list(jobs)
+    if jobs:
+        logging.info('Verifying %d QR codes' % (len(jobs)))
+    return parallel.map_jobs(verify_code, jobs, workers, pool)